@@ -1,5 +1,22 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+
 from .scope import Scope
 
 
 def build_context_from_scope(scope: Scope):
     return dict(scope=scope, request=scope)
+
+
+def call_async(func, *args, **kwargs):
+    """
+    Call a coroutine function from sync code,
+    the coroutine is scheduled as a task when an event loop is running in this thread
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return async_to_sync(func)(*args, **kwargs)
+
+    return asyncio.ensure_future(func(*args, **kwargs))
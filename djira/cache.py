@@ -0,0 +1,108 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable, Hashable, Tuple
+
+from django.contrib.auth import get_user_model
+
+from .db import database_sync_to_async
+from .settings import jira_settings
+
+_missing = object()
+
+
+class TTLCache:
+    """
+    Thread safe LRU cache whose entries expire `ttl` seconds after they are set
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self._data: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+
+            if entry is None:
+                return default
+
+            expires, value = entry
+
+            if expires < monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def get_or_set(self, key: Hashable, default: Callable[[], Any]):
+        value = self.get(key, _missing)
+
+        if value is _missing:
+            value = default()
+            self.set(key, value)
+
+        return value
+
+    def __len__(self):
+        return len(self._data)
+
+
+class UserCache(TTLCache):
+    """
+    Users loaded by pk, shared by all scopes and subscriptions of the process
+    """
+
+    def __init__(self, maxsize: int = None, ttl: float = None):
+        super().__init__(
+            maxsize or jira_settings.USER_CACHE_SIZE,
+            ttl if ttl is not None else jira_settings.USER_CACHE_TTL,
+        )
+
+    def load(self, pk):
+        return get_user_model()._default_manager.filter(pk=pk).first()
+
+    def get_user(self, pk):
+        """
+        Get user by pk, this hits the database on cache miss
+        """
+        if pk is None:
+            return None
+
+        return self.get_or_set(pk, lambda: self.load(pk))
+
+    async def aget_user(self, pk):
+        if pk is None:
+            return None
+
+        user = self.get(pk, _missing)
+
+        if user is _missing:
+            user = await database_sync_to_async(self.load)(pk)
+            self.set(pk, user)
+
+        return user
+
+
+user_cache = UserCache()
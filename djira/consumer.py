@@ -1,3 +1,5 @@
+import asyncio
+
 from typing import Any, Dict, List
 
 from asgiref.sync import sync_to_async
@@ -13,6 +15,7 @@ from rest_framework.exceptions import APIException
 
 from djira.authentication import BaseAuthentication
 from djira.observer.base_observer import BaseObserver
+from djira.observer.queue import DispatchQueue
 
 
 from .scope import Scope
@@ -89,9 +92,24 @@ class Consumer:
 
         return self._middlewares
 
+    async def on_startup(self):
+        """
+        Attach observers to the server event loop,
+        pass as `ASGIApp(..., on_startup=consumer.on_startup)`
+        """
+        loop = asyncio.get_running_loop()
+
+        DispatchQueue.attach(loop)
+
+        # asyncio managers listen on the server loop
+        if hasattr(BaseObserver.manager, "attach"):
+            BaseObserver.manager.attach(loop)
+
     def start(self):
         @self.server.event
         async def connect(sid: str, environ: dict, auth: dict):
+            await self.on_startup()
+
             for authenticator in self.authenticators:
                 if not auth:
                     raise ConnectionRefusedError("auth required in client request")
@@ -155,6 +173,6 @@ class Consumer:
                     del self._realtimes[sid]
 
                     # remove all subscribers for user
-                    BaseObserver.disconnect(lambda scope: scope.sid == sid)
+                    BaseObserver.disconnect_sid(sid)
                 except KeyError as error:
                     pass
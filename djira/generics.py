@@ -1,4 +1,5 @@
 from asyncio import iscoroutine
+from copy import copy
 from inspect import getmembers
 from typing import Any, Dict, List, Literal, Tuple
 
@@ -153,20 +154,53 @@ class GenericAPIHook(BaseAPIHook):
 
     permission_classes = jira_settings.PERMISSION_CLASSES
 
+    # filter set classes by hook class, model and `filter_fields`, built once
+    _filter_classes: Dict[Tuple[type, type, Tuple[str, ...] | str], type] = {}
+
     def get_filter_class(self):
         """
-        build api class from hook
+        build api class from hook, filtering `filter_fields` or every field when unset.
+        The class is cached, a new one is built when `queryset` model or `filter_fields` change.
+        Its filters are built from the model once, each filter set gets a copy.
         """
         assert isinstance(
             self.queryset, QuerySet
         ), "`.queryset` must be a instance of `Queryset`"
 
-        class FilterClass(ModelFilterSet):
-            class Meta:
-                fields = "__all__"
-                model = self.queryset.model
+        filter_model = self.queryset.model
+        filter_fields = tuple(self.filter_fields) if self.filter_fields else "__all__"
+        key = (type(self), filter_model, filter_fields)
+
+        filter_class = self._filter_classes.get(key)
+
+        if filter_class is None:
+
+            class FilterClass(ModelFilterSet):
+                class Meta:
+                    model = filter_model
+                    fields = (
+                        list(filter_fields)
+                        if filter_fields != "__all__"
+                        else filter_fields
+                    )
+
+                # unbound filters built on first use, copied for every instance,
+                # `bind` only sets attributes so form fields can be shared
+                prototype = None
+
+                def get_filters(self):
+                    cls = type(self)
+
+                    if cls.prototype is None:
+                        cls.prototype = super().get_filters()
+
+                    return {
+                        name: copy(_filter) for name, _filter in cls.prototype.items()
+                    }
+
+            filter_class = self._filter_classes.setdefault(key, FilterClass)
 
-        return FilterClass
+        return filter_class
 
     def filter_queryset(self, queryset: QuerySet):
         """
@@ -10,14 +10,16 @@ from rest_framework.serializers import Serializer
 from djira.observer.signal_observer import SignalObserver
 
 from .model_observer import ModelObserver, Action
+from .base_observer import FanOut
 
 
 def model_observer(
     sender: Model,
     serializer_class: Serializer = None,
     server: AsyncServer = None,
+    **kwargs,
 ):
-    return ModelObserver(sender, serializer_class, server).connect()
+    return ModelObserver(sender, serializer_class, server, **kwargs).connect()
 
 
 def observer(
@@ -25,12 +27,13 @@ def observer(
     sender: List[Model] | Model,
     serializer_class: Serializer = None,
     server: AsyncServer = None,
+    **kwargs,
 ):
-    model_observer = SignalObserver(sender, serializer_class, server)
+    model_observer = SignalObserver(sender, serializer_class, server, **kwargs)
 
     return model_observer.connect(
         signal, sender if isinstance(sender, (list, tuple)) else [sender]
     )
 
 
-__all__ = ["SignalObserver", "ModelObserver", "Action"]
+__all__ = ["SignalObserver", "ModelObserver", "Action", "FanOut"]
@@ -1,8 +1,6 @@
-import asyncio
 from enum import Enum
 from functools import partial
-from threading import Thread
-from typing import Callable, Dict, Generator, List, Literal
+from typing import Callable, Dict, Generator, List, Literal, Set, Tuple
 
 from rest_framework.exceptions import NotFound
 
@@ -10,8 +8,12 @@ from django.db.models import QuerySet
 
 from djira.scope import Scope
 from djira.settings import jira_settings
+from djira._utils import call_async
 
 from .manager import PubSubManager, Manager
+from .registry import SubscriptionKey, SubscriptionRegistry
+from .subscription import Subscription
+from .worker import MessageWorker
 
 
 class Action(Enum):
@@ -20,6 +22,16 @@ class Action(Enum):
     DELETE = "removed"
 
 
+class FanOut(Enum):
+    """
+    How an event is serialized for the subscribers of a room
+    """
+
+    SCOPE = "scope"  # serialize once per subscriber
+    GROUP = "group"  # serialize once per distinct serializer context
+    ROOM = "room"  # serialize once and emit once to a socket.io room
+
+
 class BaseObserver:
     """
     This the the generic implementation of all observers
@@ -27,9 +39,24 @@ class BaseObserver:
 
     model_name: str
 
-    subscribing_scopes: Dict[
-        str, List[Scope]
-    ] = {}  # all subscribing room scopes, used as context in serializing data
+    fan_out = FanOut.SCOPE
+    context_free: bool | None = None
+
+    # keep subscriptions on the node owning the sid and publish events instead
+    locality = False
+
+    # observers by name, used to route published events
+    observers: Dict[str, "BaseObserver"] = {}
+
+    # all subscribing room subscriptions, used as context in serializing data
+    subscribing_scopes = SubscriptionRegistry()
+
+    # subscription keys by sid and socket.io room in `FanOut.ROOM` mode,
+    # only changed by the thread subscribing clients, in the order clients ask
+    room_members: Dict[str, Dict[str, Set[SubscriptionKey]]] = {}
+
+    # only thread mutating `subscribing_scopes` from manager messages
+    message_worker: MessageWorker
 
     @classmethod
     def listen_to_message(cls):
@@ -46,39 +73,69 @@ class BaseObserver:
         if cls.manager is None:
             cls.manager = Manager()
 
-        cls.manager.subscribe(
-            partial(cls._on_message, "subscribe"),
-            lambda data: data.get("type") == "subscribe",
-        )
+        cls.message_worker = MessageWorker(cls._on_messages)
 
+        cls.manager.subscribe(partial(cls._on_message, "subscribe"), key="subscribe")
         cls.manager.subscribe(
             partial(cls._on_message, "unsubscribe"),
-            lambda data: data.get("type") == "unsubscribe",
+            key="unsubscribe",
         )
+        cls.manager.subscribe(
+            partial(cls._on_message, "disconnect"),
+            key="disconnect",
+        )
+        cls.manager.subscribe(cls._on_event, key="event")
+
+        # handle messages delivered before a restart, managers that can't pull have none
+        cls.manager.pull()
 
     @classmethod
     def _on_message(
         cls,
-        type: Literal["subscribe", "unsubscribe"],
+        type: Literal["subscribe", "unsubscribe", "disconnect"],
         data: dict,
     ):
-        async def inner():
+        cls.message_worker.put((type, data))
+
+    @classmethod
+    def _on_messages(
+        cls,
+        messages: List[Tuple[Literal["subscribe", "unsubscribe", "disconnect"], dict]],
+    ):
+        for type, data in messages:
             try:
+                if type == "disconnect":
+                    cls._disconnect(data)
+                    continue
+
                 room_name = data["room_name"]
-                encode_scope = data["scope"]
 
-                scope = await Scope.from_json(encode_scope)
+                if "subscription" in data:
+                    subscription = data["subscription"]
+                else:
+                    subscription = Subscription.from_json(data["scope"])
+
                 method = (
                     cls.subscribe_scope_to_room
                     if type == "subscribe"
                     else cls.unsubscribe_scope_from_room
                 )
-                method(scope, room_name)
+                method(subscription, room_name)
             except Exception as e:
                 pass  # no exception should be thrown
 
-        thread = Thread(target=asyncio.run, args=(inner(),))
-        thread.start()
+    @classmethod
+    def _on_event(cls, data: dict):
+        """
+        Fan out a model event published by any node to local subscribers
+        """
+        observer = cls.observers.get(data.get("observer"))
+
+        if observer is not None:
+            observer.receive_event(data)
+
+    def receive_event(self, data: dict):
+        raise NotImplementedError()
 
     def serialize(self, action: Action, instance: QuerySet, context: dict):
         if hasattr(self, "_serializer"):
@@ -98,10 +155,44 @@ class BaseObserver:
         The result of this method is what is sent over the socket.
         """
 
+        assert self.fan_out != FanOut.ROOM or self.context_free, (
+            "`fan_out=room` serializes once without context, "
+            "pass `context_free=True` to use a serializer function"
+        )
+
         self._serializer = func
         return self
 
-    def participants(self, func: Callable[[List[Scope], QuerySet], List[Scope]]):
+    @property
+    def is_context_free(self) -> bool:
+        """
+        Context free serializers output the same data for every subscriber
+        """
+        if self.context_free is not None:
+            return self.context_free
+
+        if hasattr(self, "_serializer"):
+            return False
+
+        if self.serializer_class:
+            return getattr(self.serializer_class, "context_free", False)
+
+        return True
+
+    def get_context_key(self, subscription: Subscription):
+        """
+        Subscribers with the same context key share serialized data
+        in `FanOut.GROUP` mode
+        """
+        if self.is_context_free:
+            return None
+
+        return (subscription.user_pk, subscription.origin)
+
+    def participants(
+        self,
+        func: Callable[[List[Subscription], QuerySet], List[Subscription]],
+    ):
         """
         a wrapper to get room participants do exclude here
         """
@@ -125,19 +216,28 @@ class BaseObserver:
         return self
 
     @classmethod
-    def subscribe_scope_to_room(cls, scope: Scope, room_name: str):
+    def subscribe_scope_to_room(cls, scope: Scope | Subscription, room_name: str):
         """
         Subscribe client to a room,
-        Todo make subscription unique to a room by `namespace`, `sid`
+        subscriptions are unique to a room by `sid`, `namespace` and `requestId`
         """
 
-        if room_name not in cls.subscribing_scopes:
-            cls.subscribing_scopes[room_name] = []
+        if isinstance(scope, Scope):
+            scope = Subscription.from_scope(scope)
+
+        added = cls.subscribing_scopes.add(room_name, scope)
+
+        if added and cls.subscribing_scopes.size(room_name) == 1:
+            cls._watch_rooms([room_name])
 
-        cls.subscribing_scopes[room_name].append(scope)
+        return added
 
     @classmethod
-    def unsubscribe_scope_from_room(cls, scope: Scope, room_name: str):
+    def unsubscribe_scope_from_room(
+        cls,
+        scope: Scope | Subscription,
+        room_name: str,
+    ):
         """
         unsubscribe a scope from a room
         """
@@ -145,25 +245,94 @@ class BaseObserver:
         if room_name not in cls.subscribing_scopes:
             raise NotFound("can't unsubscribe, subscriber not found")
 
-        scopes = cls.subscribing_scopes[room_name]
+        if isinstance(scope, Scope):
+            scope = Subscription.from_scope(scope)
 
-        indexes = [
-            index
-            for index, element in enumerate(scopes)
-            if element.request_id == scope.request_id
-        ]
+        removed = cls.subscribing_scopes.remove(room_name, scope)
 
-        for index in indexes:
-            scopes.remove(scopes[index])
+        if removed:
+            cls._unwatch_empty_rooms([room_name])
 
-        return scopes
+        return removed
+
+    @classmethod
+    def _watch_rooms(cls, rooms: List[str]):
+        """
+        Let the manager receive events of rooms with local subscribers
+        """
+
+        manager = getattr(cls, "manager", None)
+
+        if manager is not None:
+            for room_name in rooms:
+                manager.watch(room_name)
+
+    @classmethod
+    def _unwatch_empty_rooms(cls, rooms: List[str]):
+        manager = getattr(cls, "manager", None)
+
+        if manager is not None:
+            for room_name in rooms:
+                if room_name not in cls.subscribing_scopes:
+                    manager.unwatch(room_name)
 
     def get_participants(self, room_name):
         """
         Get all room participants
         """
 
-        return self.subscribing_scopes.get(room_name, [])
+        return self.subscribing_scopes.participants(room_name)
+
+    def get_participants_count(self, room_name):
+        """
+        Get number of room participants
+        """
+
+        return self.subscribing_scopes.size(room_name)
+
+    @staticmethod
+    def get_room_key(room_name: str, namespace: str, action: str | None):
+        """
+        Name of the socket.io room backing a room in `FanOut.ROOM` mode
+        """
+
+        return "djira:%s:%s:%s" % (namespace, action, room_name)
+
+    def _update_room_membership(
+        self,
+        scope: Scope,
+        room_name: str,
+        type: Literal["subscribe", "unsubscribe"],
+    ):
+        """
+        Enter or leave the socket.io room backing `room_name`
+        """
+
+        room_key = self.get_room_key(room_name, scope.namespace, scope.action)
+        key = Subscription.from_scope(scope).key
+
+        sid_rooms = self.room_members.setdefault(scope.sid, {})
+
+        if type == "subscribe":
+            sid_rooms.setdefault(room_key, set()).add(key)
+
+            return call_async(self.server.enter_room, scope.sid, room_key)
+
+        keys = sid_rooms.get(room_key)
+
+        if keys is None:
+            return None
+
+        keys.discard(key)
+
+        # leave once no other subscription of sid uses the socket.io room
+        if not keys:
+            del sid_rooms[room_key]
+
+            if not sid_rooms:
+                del self.room_members[scope.sid]
+
+            return call_async(self.server.leave_room, scope.sid, room_key)
 
     def _send_data(
         self,
@@ -171,6 +340,21 @@ class BaseObserver:
         room_name: str,
         type: Literal["subscribe", "unsubscribe"],
     ):
+        if self.fan_out == FanOut.ROOM:
+            self._update_room_membership(scope, room_name, type)
+
+        # only this node serves the sid, skip the cluster wide broadcast
+        if self.locality:
+            return self.message_worker.put(
+                (
+                    type,
+                    {
+                        "subscription": Subscription.from_scope(scope),
+                        "room_name": room_name,
+                    },
+                )
+            )
+
         return self.manager.send_data(
             {
                 "scope": scope.to_json(),
@@ -179,52 +363,86 @@ class BaseObserver:
             {"type": type},
         )
 
-    def subscribe(self, scope: Scope):
+    def get_subscribing_rooms(self, scope: Scope) -> List[str]:
         """
-        This should be called to subscribe the current hook.
+        Rooms a subscription request joins, defaults to the model name
         """
 
         if hasattr(self, "_subscribing_rooms"):
-            subscribing_rooms = self._subscribing_rooms(scope)
+            return list(self._subscribing_rooms(scope))
 
-            for subscribing_room in subscribing_rooms:
-                return self._send_data(scope, subscribing_room, "subscribe")
-        else:
-            return self._send_data(scope, self.model_name, "subscribe")
+        return [self.model_name]
+
+    def subscribe(self, scope: Scope):
+        """
+        This should be called to subscribe the current hook.
+        """
+
+        return [
+            self._send_data(scope, subscribing_room, "subscribe")
+            for subscribing_room in self.get_subscribing_rooms(scope)
+        ]
 
     def unsubscribe(self, scope: Scope):
         """
         This should be called to unsubscribe the current hook.
         """
 
-        if hasattr(self, "_subscribing_rooms"):
-            subscribing_rooms = self._subscribing_rooms(scope)
-
-            for subscribing_room in subscribing_rooms:
-                return self._send_data(scope, subscribing_room, "unsubscribe")
-        else:
-            return self._send_data(scope, self.model_name, "unsubscribe")
+        return [
+            self._send_data(scope, subscribing_room, "unsubscribe")
+            for subscribing_room in self.get_subscribing_rooms(scope)
+        ]
 
     @classmethod
-    def disconnect(cls, predicate: Callable[[Scope], bool]):
+    def disconnect(cls, predicate: Callable[[Subscription], bool]):
         """
-        unsubscribe using a predicate
+        unsubscribe subscriptions of this node using a predicate, this scans every subscription
+        use `disconnect_sid` to unsubscribe a client
         ```
-        sid = "..."
-        BaseObserver.disconnect(lambda scope: scope.sid == sid)
+        BaseObserver.disconnect(lambda subscription: subscription.user_pk == user_id)
         ```
-        return rooms user is disconnected from
-        """
-        rooms = set()
-        for room, scopes in cls.subscribing_scopes.items():
-            scopes_to_remove = []
-            for scope in scopes:
-                if predicate(scope):
-                    scopes_to_remove.append(scope)
-                    rooms.add(room)
-
-            # Remove the scopes that match the predicate
-            for scope in scopes_to_remove:
-                scopes.remove(scope)
+        subscriptions are removed by the message worker, after subscribes waiting to be handled
+        """
+
+        if not hasattr(cls, "message_worker"):
+            return cls._disconnect({"predicate": predicate})
+
+        cls.message_worker.put(("disconnect", {"predicate": predicate}))
+
+    @classmethod
+    def disconnect_sid(cls, sid: str):
+        """
+        unsubscribe all subscriptions owned by sid on every node,
+        only on this node when every observer uses locality.
+        Subscriptions are removed after subscribes of sid waiting to be handled.
+        """
+
+        # socket.io drops a disconnected sid from its rooms
+        cls.room_members.pop(sid, None)
+
+        if not hasattr(cls, "manager"):
+            return cls._disconnect({"sid": sid})
+
+        # with locality no other node holds subscriptions of sid
+        if cls.observers and all(
+            observer.locality for observer in cls.observers.values()
+        ):
+            return cls.message_worker.put(("disconnect", {"sid": sid}))
+
+        cls.manager.send_data({"sid": sid}, {"type": "disconnect"})
+
+    @classmethod
+    def _disconnect(cls, data: dict):
+        """
+        Remove subscriptions of `data["sid"]` or matching `data["predicate"]`,
+        return rooms they are removed from
+        """
+
+        if "sid" in data:
+            rooms = cls.subscribing_scopes.remove_sid(data["sid"])
+        else:
+            rooms = cls.subscribing_scopes.remove_where(data["predicate"])
+
+        cls._unwatch_empty_rooms(rooms)
 
         return rooms
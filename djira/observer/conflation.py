@@ -0,0 +1,176 @@
+import heapq
+import logging
+
+from copy import copy
+from itertools import count
+from threading import Condition, Thread
+from time import monotonic
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+from .base_observer import Action
+from .transaction import coalesce
+
+logger = logging.getLogger(__name__)
+
+
+class Conflator:
+    """
+    Keep only the latest state of each `(room, pk)` within a window and emit it once.
+
+    With `max_rate` (events per second) the first event of a key is emitted right away
+    and later ones are held until `1 / max_rate` seconds passed since the last emit.
+    With `debounce` (seconds) events are held until the key has been quiet for `debounce`.
+    Held events are merged like transaction events, a create followed by a delete
+    is never emitted.
+    `submit` returns `True` when the event should be emitted right away,
+    a single scheduler thread flushes held events through `handler(room, action, instance, **kwargs)`.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[..., Any],
+        max_rate: float | None = None,
+        debounce: float | None = None,
+    ):
+        assert bool(max_rate) != bool(debounce), "set one of `max_rate` or `debounce`"
+
+        self.handler = handler
+        self.interval = 1 / max_rate if max_rate else None
+        self.debounce = debounce
+
+        self.received = 0
+        self.emitted = 0
+        self.suppressed = 0
+
+        # key -> [action, instance, kwargs, due], action is None when cancelled out
+        self._pending: Dict[Hashable, List] = {}
+        self._last_emit: Dict[Hashable, float] = {}
+        self._deadlines: List[Tuple[float, int, Hashable]] = []
+        self._counter = count()
+        self._condition = Condition()
+        self._thread: Thread | None = None
+
+    @property
+    def stats(self):
+        return dict(
+            received=self.received,
+            emitted=self.emitted,
+            suppressed=self.suppressed,
+            pending=len(self._pending),
+        )
+
+    def submit(self, room: str, action: Action, instance, **kwargs) -> bool:
+        key = (room, instance.pk)
+        now = monotonic()
+        emit = False
+
+        with self._condition:
+            self.received += 1
+            pending = self._pending.get(key)
+
+            if pending is None:
+                last_emit = self._last_emit.get(key)
+
+                if self.interval and (
+                    last_emit is None or now - last_emit >= self.interval
+                ):
+                    self._last_emit[key] = now
+                    self.emitted += 1
+                    emit = True
+                else:
+                    due = (
+                        last_emit + self.interval
+                        if self.interval
+                        else now + self.debounce
+                    )
+                    self._pending[key] = [action, copy(instance), kwargs, due]
+                    self._schedule(due, key)
+            else:
+                # the held event is replaced, it will never be emitted
+                self.suppressed += 1
+                self.merge(pending, action, instance, kwargs)
+
+                if self.debounce:
+                    pending[3] = now + self.debounce
+                    self._schedule(pending[3], key)
+
+        return emit
+
+    def merge(self, pending: List, action: Action, instance, kwargs: dict):
+        if pending[0] is not None and "changed_fields" in kwargs:
+            kwargs["changed_fields"] = kwargs["changed_fields"] | pending[2].get(
+                "changed_fields", set()
+            )
+
+        # filters compare against the state before the first change
+        if pending[0] is not None:
+            kwargs.pop("previous", None)
+
+            if "previous" in pending[2]:
+                kwargs["previous"] = pending[2]["previous"]
+
+        pending[0] = coalesce(pending[0], action)
+        pending[1] = copy(instance)
+        pending[2] = kwargs
+
+    def _schedule(self, due: float, key: Hashable):
+        heapq.heappush(self._deadlines, (due, next(self._counter), key))
+
+        if self._thread is None:
+            self._thread = Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+        self._condition.notify()
+
+    def _pop_due(self) -> List[Tuple[Hashable, List]]:
+        now = monotonic()
+        due = []
+
+        while self._deadlines and self._deadlines[0][0] <= now:
+            deadline, _, key = heapq.heappop(self._deadlines)
+            pending = self._pending.get(key)
+
+            # stale deadline of a debounced key pushed back since
+            if pending is None or pending[3] > deadline:
+                continue
+
+            del self._pending[key]
+            due.append((key, pending))
+
+            if self.interval:
+                self._last_emit[key] = now
+
+        # forget keys idle for a whole window so the map does not grow forever
+        if self.interval and len(self._last_emit) > 2 * len(self._pending) + 1024:
+            self._last_emit = {
+                key: last_emit
+                for key, last_emit in self._last_emit.items()
+                if now - last_emit < self.interval or key in self._pending
+            }
+
+        return due
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._deadlines:
+                    self._condition.wait()
+
+                due = self._pop_due()
+
+                if not due:
+                    if self._deadlines:
+                        self._condition.wait(self._deadlines[0][0] - monotonic())
+                    continue
+
+            for (room, _), (action, instance, kwargs, _) in due:
+                if action is None:
+                    self.suppressed += 1
+                    continue
+
+                self.emitted += 1
+
+                try:
+                    self.handler(room, action, instance, **kwargs)
+                except Exception:
+                    logger.exception("conflated event dispatch failed")
@@ -0,0 +1,190 @@
+import json
+
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Field, Model
+
+from rest_framework.exceptions import ValidationError
+
+
+def _lower(value):
+    return None if value is None else str(value).lower()
+
+
+def _compare(operator: Callable[[Any, Any], bool]):
+    def lookup(value, expected):
+        return value is not None and operator(value, expected)
+
+    return lookup
+
+
+def _text(operator: Callable[[str, str], bool], ignore_case: bool = False):
+    def lookup(value, expected):
+        if value is None:
+            return False
+
+        value = str(value)
+
+        if ignore_case:
+            return operator(value.lower(), expected.lower())
+
+        return operator(value, expected)
+
+    return lookup
+
+
+LOOKUPS: Dict[str, Callable[[Any, Any], bool]] = {
+    "exact": lambda value, expected: value == expected,
+    "iexact": lambda value, expected: _lower(value) == _lower(expected),
+    "in": lambda value, expected: value in expected,
+    "contains": _text(lambda value, expected: expected in value),
+    "icontains": _text(lambda value, expected: expected in value, True),
+    "startswith": _text(str.startswith),
+    "istartswith": _text(str.startswith, True),
+    "endswith": _text(str.endswith),
+    "iendswith": _text(str.endswith, True),
+    "gt": _compare(lambda value, expected: value > expected),
+    "gte": _compare(lambda value, expected: value >= expected),
+    "lt": _compare(lambda value, expected: value < expected),
+    "lte": _compare(lambda value, expected: value <= expected),
+    "range": _compare(lambda value, expected: expected[0] <= value <= expected[1]),
+    "isnull": lambda value, expected: (value is None) == expected,
+}
+
+TEXT_LOOKUPS = {
+    "iexact",
+    "contains",
+    "icontains",
+    "startswith",
+    "istartswith",
+    "endswith",
+    "iendswith",
+}
+
+# (attname, lookup, expected value, negate)
+Condition = Tuple[str, Callable[[Any, Any], bool], Any, bool]
+
+
+def get_query_key(query: dict) -> str:
+    """
+    Identical queries share a key so their predicate is evaluated once per event
+    """
+    return json.dumps(query, sort_keys=True, default=str)
+
+
+def _split(value) -> List[Any]:
+    if isinstance(value, (list, tuple)):
+        return list(value)
+
+    return str(value).split(",")
+
+
+class QueryPredicate:
+    """
+    Predicate compiled from a `url_filter` style query, evaluated against an instance
+    with no database query.
+    ```
+    {"status": "open", "region__in": "eu,us", "closed_at__isnull": "true", "owner!": 1}
+    ```
+    Keys are concrete fields of the model, foreign keys are compared by pk,
+    a key ending with `!` is negated. Like `url_filter`, keys that can't be filtered
+    (unknown fields such as `page` or `ordering`, lookups spanning relations) are ignored.
+    """
+
+    def __init__(self, model: Model, query: dict):
+        self.model = model
+        self.conditions: List[Condition] = [
+            condition
+            for condition in (self.compile(key, value) for key, value in query.items())
+            if condition is not None
+        ]
+        self.attnames: Set[str] = {condition[0] for condition in self.conditions}
+
+    def get_field(self, name: str) -> Optional[Field]:
+        """
+        Field filtered by `name`, `None` when it can't be filtered in memory
+        """
+        if name == "pk":
+            return self.model._meta.pk
+
+        try:
+            field = self.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+
+        if not field.concrete or field.many_to_many:
+            return None
+
+        return field
+
+    def compile(self, key: str, value: Any) -> Optional[Condition]:
+        negate = key.endswith("!")
+        parts = key.rstrip("!").split("__")
+        lookup = "exact"
+
+        if len(parts) > 1 and parts[-1] in LOOKUPS:
+            lookup = parts.pop()
+
+        field = self.get_field(parts[0]) if len(parts) == 1 else None
+
+        if field is None:
+            return None
+
+        try:
+            expected = self.to_python(field, lookup, value)
+        except (DjangoValidationError, TypeError, ValueError) as error:
+            raise ValidationError({key: getattr(error, "messages", [str(error)])})
+
+        return (field.attname, LOOKUPS[lookup], expected, negate)
+
+    def to_python(self, field: Field, lookup: str, value: Any):
+        """
+        Coerce query value like `url_filter` does, with the field's form field
+        """
+        if field.is_relation:
+            field = field.target_field
+
+        form_field = field.formfield()
+        to_python = form_field.to_python if form_field else field.to_python
+
+        if lookup == "isnull":
+            return value in (True, 1, "1", "true", "True")
+
+        if lookup in TEXT_LOOKUPS:
+            return str(value)
+
+        if lookup == "in":
+            return {to_python(item) for item in _split(value)}
+
+        if lookup == "range":
+            start, end = _split(value)
+            return (to_python(start), to_python(end))
+
+        return to_python(value)
+
+    def __call__(self, instance: Model) -> bool:
+        return self.match(lambda attname: getattr(instance, attname, None))
+
+    def match_values(self, values: Dict[str, Any]) -> Optional[bool]:
+        """
+        Match field values by attname, such as the state of an instance before a save,
+        `None` when a filtered field is missing from `values`
+        """
+        if not self.attnames <= values.keys():
+            return None
+
+        return self.match(values.__getitem__)
+
+    def match(self, get_value: Callable[[str], Any]) -> bool:
+        for attname, lookup, expected, negate in self.conditions:
+            try:
+                matched = lookup(get_value(attname), expected)
+            except TypeError:
+                matched = False
+
+            if matched == negate:
+                return False
+
+        return True
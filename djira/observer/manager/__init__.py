@@ -2,5 +2,14 @@ from .base_manager import BaseManager
 from .manager import Manager
 from .pubsub_manager import PubSubManager
 from .redis_manager import RedisManager
+from .async_redis_manager import AsyncRedisManager
+from .redis_stream_manager import RedisStreamManager
 
-__all__ = ["BaseManager", "PubSubManager", "RedisManager", "Manager"]
+__all__ = [
+    "BaseManager",
+    "PubSubManager",
+    "RedisManager",
+    "AsyncRedisManager",
+    "RedisStreamManager",
+    "Manager",
+]
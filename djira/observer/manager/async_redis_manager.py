@@ -0,0 +1,272 @@
+import asyncio
+import logging
+
+from functools import partial
+from typing import Awaitable, Callable, List, Set
+
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.asyncio.client import PubSub
+from redis.exceptions import RedisError
+
+from .outbox import Outbox
+from .pubsub_manager import PubSubManager
+from .redis_manager import create_pools
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRedisManager(PubSubManager):
+    """
+    RedisManager built on `redis.asyncio`, messages are published with `await`
+    and the channel is consumed by a task on the server event loop, no thread is used.
+    Channels are not sharded, every node receives every room.
+    Messages that can't be published are kept in an outbox, see `RedisManager`.
+
+    manager = AsyncRedisManager.connect_from_url(url)
+    # attached to the loop by `Consumer.on_startup`, messages sent before are queued
+    """
+
+    redis: Redis
+    pubsub: PubSub
+    subscriber: Redis
+
+    def __init__(
+        self,
+        connect: Callable[["AsyncRedisManager"], Awaitable],
+        outbox_size: int = None,
+        outbox_overflow: str = None,
+        outbox_path: str = None,
+        **kwargs,
+    ):
+        self._connect = partial(connect, self)
+
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self._task: asyncio.Task | None = None
+        self._ready: asyncio.Event | None = None
+        self._pending: List[dict] = []
+
+        # publish tasks, referenced until done so they are not garbage collected
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.outbox = Outbox.from_settings(outbox_size, outbox_overflow, outbox_path)
+        self._outbox_event: asyncio.Event | None = None
+        self._outbox_task: asyncio.Task | None = None
+
+        super().__init__(**kwargs)
+
+    @classmethod
+    def connect_from_url(
+        cls,
+        url: str,
+        max_connections: int = None,
+        health_check_interval: int = None,
+        pool_timeout: float = None,
+        **kwargs,
+    ):
+        """
+        Connect with pools created once, see `create_pools`
+        """
+        publish_pool, subscribe_pool = create_pools(
+            BlockingConnectionPool,
+            url,
+            max_connections,
+            health_check_interval,
+            pool_timeout,
+        )
+
+        async def connect(self: "AsyncRedisManager"):
+            if not hasattr(self, "redis"):
+                self.redis = Redis(connection_pool=publish_pool)
+                self.subscriber = Redis(connection_pool=subscribe_pool)
+
+            self.pubsub = self.subscriber.pubsub(ignore_subscribe_messages=True)
+            await self.pubsub.subscribe(self.channel_key)
+
+        return cls(connect, **kwargs)
+
+    def initialize(self):
+        try:
+            self.attach(asyncio.get_running_loop())
+        except RuntimeError:
+            pass  # no loop yet, attached on server startup
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """
+        Start listening on the server event loop
+        """
+        if self.loop is loop:
+            return
+
+        self.loop = loop
+
+        def _start():
+            self._ready = asyncio.Event()
+            self._outbox_event = asyncio.Event()
+            self._task = loop.create_task(self._run())
+
+        if self._in_loop():
+            _start()
+        else:
+            loop.call_soon_threadsafe(_start)
+
+    def _in_loop(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def _publish(self, payload: dict):
+        """
+        Schedule publish on the event loop, return the task or future
+        """
+        if self.loop is None:
+            self._pending.append(payload)
+            return None
+
+        if self._in_loop():
+            task = self.loop.create_task(self.publish(payload))
+            self._tasks.add(task)
+            task.add_done_callback(self._on_published)
+
+            return task
+
+        return asyncio.run_coroutine_threadsafe(self.publish(payload), self.loop)
+
+    def _on_published(self, task: asyncio.Task):
+        self._tasks.discard(task)
+
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("failed to publish message", exc_info=task.exception())
+
+    async def asend_data(
+        self,
+        data: dict,
+        filter: dict | None,
+        room: str | None = None,
+    ):
+        """
+        Send data to all subscribing clients and wait for it to be published
+        """
+        if self.loop is None:
+            self.attach(asyncio.get_running_loop())
+
+        return await self.publish(dict(data=data, filter=filter))
+
+    @property
+    def outbox_stats(self):
+        return self.outbox.stats if self.outbox is not None else None
+
+    async def publish(self, payload: dict):
+        encoded = self.codec.encode(payload)
+
+        if self.outbox is None:
+            # waits while disconnected, publishes resume once reconnected
+            await self._ready.wait()
+        elif len(self.outbox) or not self._ready.is_set():
+            # queue behind the backlog so messages are published in order
+            return self._put_outbox(encoded)
+
+        try:
+            return await self._send(encoded)
+        except RedisError:
+            if self.outbox is None:
+                raise
+
+            logger.warning("failed to publish message, keeping it in outbox")
+
+            return self._put_outbox(encoded)
+
+    async def _send(self, data: bytes):
+        return await self.redis.publish(self.channel_key, data)
+
+    def _put_outbox(self, data: bytes):
+        self.outbox.put(self.channel_key, data)
+
+        if self._outbox_task is None:
+            self._outbox_task = self.loop.create_task(self._drain_outbox())
+
+        self._outbox_event.set()
+
+    async def _drain_outbox(self):
+        retry_sleep = 0.1
+
+        while True:
+            entry = self.outbox.peek()
+
+            if entry is None:
+                self._outbox_event.clear()
+                await self._outbox_event.wait()
+                continue
+
+            await self._ready.wait()
+
+            try:
+                await self._send(entry[2])
+            except RedisError:
+                # the listening task reconnects and sets `_ready` again
+                await asyncio.sleep(retry_sleep)
+                retry_sleep = min(retry_sleep * 2, 1)
+                continue
+
+            retry_sleep = 0.1
+            self.outbox.pop()
+
+    async def _run(self):
+        retry_sleep = 1
+
+        while True:
+            try:
+                await self._connect()
+                retry_sleep = 1
+
+                self._ready.set()
+
+                pending, self._pending = self._pending, []
+
+                for payload in pending:
+                    await self.publish(payload)
+
+                async for message in self._messages():
+                    try:
+                        self._on_message(message)
+                    except Exception:
+                        logger.exception("failed to handle message")
+            except (RedisError, OSError):
+                self._ready.clear()
+                await self._disconnect()
+
+                logger.warning("redis connection lost, retrying in %ss", retry_sleep)
+                await asyncio.sleep(retry_sleep)
+
+                retry_sleep = min(retry_sleep * 2, 60)
+
+    async def _messages(self):
+        # read with a timeout instead of `listen` so idle connections are health checked
+        while True:
+            message = await self.pubsub.get_message(timeout=1.0)
+
+            if message is not None:
+                yield message
+
+    async def _disconnect(self):
+        """
+        Release the subscribe connection back to its pool
+        """
+        try:
+            if hasattr(self, "pubsub"):
+                await self.pubsub.aclose()
+        except (RedisError, OSError):
+            pass
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+
+        if self._outbox_task is not None:
+            self._outbox_task.cancel()
+
+        await self._disconnect()
+
+        if hasattr(self, "redis"):
+            await self.redis.aclose(close_connection_pool=True)
+            await self.subscriber.aclose(close_connection_pool=True)
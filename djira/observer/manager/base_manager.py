@@ -1,31 +1,141 @@
-from typing import Callable, List, Optional, Tuple
+from time import perf_counter
+from typing import Callable, Dict, List, Optional
+from zlib import crc32
+
+from djira.settings import jira_settings
+
+from .codec import Codec
 
 
 class UniqueError(Exception):
     pass
 
+
+class Listener:
+    """
+    Registered callback and its call statistics
+    """
+
+    __slots__ = ("callback", "filter", "key", "calls", "errors", "time", "max_time")
+
+    def __init__(
+        self,
+        callback: Callable[[dict], None],
+        filter: Optional[Callable[[dict], bool]] = None,
+        key: Optional[str] = None,
+    ):
+        self.callback = callback
+        self.filter = filter
+        self.key = key
+
+        self.calls = 0
+        self.errors = 0
+        self.time = 0.0
+        self.max_time = 0.0
+
+    @property
+    def stats(self):
+        return dict(
+            listener=self.name,
+            key=self.key,
+            calls=self.calls,
+            errors=self.errors,
+            avg_time=self.time / self.calls if self.calls else 0,
+            max_time=self.max_time,
+        )
+
+    @property
+    def name(self) -> str:
+        callback = getattr(self.callback, "func", self.callback)  # unwrap partial
+
+        return getattr(callback, "__qualname__", repr(callback))
+
+    def matches(self, callback, filter, key) -> bool:
+        return (self.callback, self.filter, self.key) == (callback, filter, key)
+
+    def __call__(self, data: dict):
+        started = perf_counter()
+
+        try:
+            return self.callback(data)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            elapsed = perf_counter() - started
+
+            self.calls += 1
+            self.time += elapsed
+            self.max_time = max(self.max_time, elapsed)
+
+
 class BaseManager:
     channel_key = "DJIRA_SOCKET_MANAGER"
 
-    def __init__(self):
-        self._listeners: Tuple[
-            Callable[[dict], None],
-            Optional[Callable[[dict], bool]],
-        ] = []
+    # filter field keyed listeners are routed by
+    key_field = "type"
+
+    # number of channels room messages are spread over, see `get_shard`
+    shards = 1
+
+    def __init__(self, codec: Codec | None = None):
+        # listeners by `key_field` value, found with a single lookup
+        self._keyed_listeners: Dict[str, List[Listener]] = {}
+
+        # listeners with a predicate filter or no filter, checked one by one
+        self._listeners: List[Listener] = []
+
+        # encodes payloads crossing process boundaries
+        self.codec = codec or jira_settings.MANAGER_CODEC()
+
+    @property
+    def listeners(self) -> List[Listener]:
+        return [
+            listener
+            for listeners in self._keyed_listeners.values()
+            for listener in listeners
+        ] + self._listeners
+
+    @property
+    def listener_stats(self):
+        return [listener.stats for listener in self.listeners]
 
     def _on_data(self, payload: dict) -> Optional[List[Exception]]:
         """
         ondata listener that trigger all registered listeners
         """
+        # envelope of messages published together
+        if "batch" in payload:
+            errors = []
+
+            for item in payload["batch"]:
+                errors += self._notify(item) or []
+
+            return errors if len(errors) > 0 else None
+
+        return self._notify(payload)
+
+    def get_listeners(self, filter_data: dict | None) -> List[Listener]:
+        """
+        Listeners of a message, keyed listeners first,
+        messages without filter data reach every listener
+        """
+        if not filter_data:
+            return self.listeners
+
+        return self._keyed_listeners.get(filter_data.get(self.key_field), []) + [
+            listener
+            for listener in self._listeners
+            if listener.filter is None or listener.filter(filter_data)
+        ]
+
+    def _notify(self, payload: dict) -> Optional[List[Exception]]:
         data = payload["data"]
         errors: List[Exception] = []
-        filter_data = payload["filter"]
 
-        for callback, filter in self._listeners:
-            if filter and filter_data and not filter(filter_data):
-                continue
+        for listener in self.get_listeners(payload["filter"]):
             try:
-                callback(data)
+                listener(data)
             except Exception as error:
                 errors.append(error)
 
@@ -36,17 +146,54 @@ class BaseManager:
         callback: Callable[[dict], None],
         filter: Optional[Callable[[dict], bool]] = None,
         unique_listeners=True,
+        key: Optional[str] = None,
     ):
         """
-        subscribe to data updates, trigger callback with optional custom filter when new data is pushed
+        subscribe to data updates, trigger callback with optional custom filter when new data is pushed.
+        With `key` the callback only receives messages whose `key_field` is `key`,
+        routed with a dict lookup instead of calling a filter.
         """
-        if unique_listeners and (callback, filter) in self._listeners:
+        assert key is None or filter is None, "set one of `filter` or `key`"
+
+        if unique_listeners and any(
+            listener.matches(callback, filter, key) for listener in self.listeners
+        ):
             raise UniqueError("listener with  callback already exist")
 
-        self._listeners.append((callback, filter))
+        listener = Listener(callback, filter, key)
+
+        if key is None:
+            self._listeners.append(listener)
+        else:
+            self._keyed_listeners.setdefault(key, []).append(listener)
+
+        return listener
+
+    def get_shard(self, room: str | None) -> Optional[int]:
+        """
+        Shard of a room, `None` for messages every node receives
+        """
+        if room is None or self.shards <= 1:
+            return None
+
+        return crc32(room.encode()) % self.shards
+
+    def watch(self, room: str):
+        """
+        Receive messages of room, called when it gains its first local subscriber.
+        Managers without shards receive every room.
+        """
+
+    def unwatch(self, room: str):
+        """
+        Stop receiving messages of room, called when its last local subscriber left
+        """
 
     def _pull_data(self) -> List[dict]:
-        return NotImplementedError("BaseManager does not support pulling")
+        """
+        Payloads delivered but not acknowledged, managers that can't pull have none
+        """
+        return []
 
     def pull(self) -> Optional[List[Exception]]:
         """
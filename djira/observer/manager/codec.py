@@ -0,0 +1,84 @@
+import json
+
+import msgpack
+
+
+class CodecError(Exception):
+    pass
+
+
+class Codec:
+    """
+    Encode manager payloads to bytes and back
+    """
+
+    def encode(self, payload: dict) -> bytes:
+        raise NotImplementedError()
+
+    def decode(self, data: bytes | str) -> dict:
+        raise NotImplementedError()
+
+
+class JSONCodec(Codec):
+    """
+    Plain json, what managers sent before codecs were pluggable
+    """
+
+    def encode(self, payload: dict) -> bytes:
+        return json.dumps(payload, separators=(",", ":")).encode()
+
+    def decode(self, data: bytes | str) -> dict:
+        return json.loads(data)
+
+
+class BinaryCodec(Codec):
+    """
+    Framed binary encoding, `MAGIC`, `VERSION` and a format byte followed by the body.
+    The body is compact json unless `use_msgpack`, see `MsgpackCodec`.
+    Json payloads without a frame are decoded too, so nodes still sending json
+    during a rolling upgrade are understood.
+    """
+
+    MAGIC = 0xD7  # never the first byte of a json document
+    VERSION = 1
+
+    JSON = 0
+    MSGPACK = 1
+
+    def __init__(self, use_msgpack: bool = False):
+        self.format = self.MSGPACK if use_msgpack else self.JSON
+        self.header = bytes((self.MAGIC, self.VERSION, self.format))
+
+    def encode(self, payload: dict) -> bytes:
+        if self.format == self.MSGPACK:
+            body = msgpack.packb(payload, use_bin_type=True)
+        else:
+            body = json.dumps(payload, separators=(",", ":")).encode()
+
+        return self.header + body
+
+    def decode(self, data: bytes | str) -> dict:
+        if isinstance(data, str) or not data or data[0] != self.MAGIC:
+            return json.loads(data)
+
+        version, format = data[1], data[2]
+
+        if version != self.VERSION:
+            raise CodecError("unsupported payload version %d" % version)
+
+        if format == self.MSGPACK:
+            return msgpack.unpackb(data[3:], raw=False)
+
+        if format == self.JSON:
+            return json.loads(data[3:])
+
+        raise CodecError("unknown payload format %d" % format)
+
+
+class MsgpackCodec(BinaryCodec):
+    """
+    `BinaryCodec` with a msgpack body, the default manager codec
+    """
+
+    def __init__(self):
+        super().__init__(use_msgpack=True)
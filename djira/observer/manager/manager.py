@@ -1,27 +1,43 @@
-from django.dispatch import Signal
+import asyncio
 
 from .pubsub_manager import PubSubManager
 
 
-signal = Signal(use_caching=True)
+class Manager(PubSubManager):
+    """
+    In-process manager for single node deployments and tests.
 
+    `send_data` calls listeners directly, payloads are not encoded and no thread is used.
+    With `asynchronous=True` payloads are handed off to the server event loop
+    once the manager is attached to it by `Consumer.on_startup`,
+    so the sender does not run listeners.
+    """
+
+    def __init__(self, asynchronous: bool = False, **kwargs):
+        self.asynchronous = asynchronous
+        self.loop: asyncio.AbstractEventLoop | None = None
+
+        super().__init__(**kwargs)
 
-class Manager(PubSubManager):
     def initialize(self):
-        signal.connect(self._listen)
+        pass  # nothing to listen to
 
-    def _listen(self, payload: dict, **kwargs):
-        self._on_data(payload)
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
 
-    def send_data(self, data: dict, filter: dict | None = None):
+    def send_data(
+        self,
+        data: dict,
+        filter: dict | None = None,
+        room: str | None = None,
+    ):
         """
-        Send data to all subscribing clients
+        Send data to all subscribing clients, the only node receives every room
         """
         payload = dict(data=data, filter=filter)
 
-        return signal.send(
-            Manager,
-            payload=payload,
-            instance=self,
-            created=True,
-        )
+        if self.asynchronous and self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._on_data, payload)
+            return None
+
+        return self._on_data(payload)
@@ -0,0 +1,189 @@
+import os
+import struct
+import weakref
+
+from collections import deque
+from itertools import count
+from threading import Lock
+from time import time
+from typing import Deque, Optional, Tuple
+
+from djira.settings import jira_settings
+
+# timestamp, channel and data of a message waiting to be published
+Entry = Tuple[float, str, bytes]
+
+# spilled record header, timestamp, channel length and data length
+HEADER = struct.Struct("!dHI")
+
+
+class OutboxFull(Exception):
+    pass
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class Outbox:
+    """
+    Messages waiting for the broker to come back, published in order once it does.
+
+    Up to `maxsize` messages are kept in memory, on overflow `overflow` decides:
+    `drop_oldest` drops the oldest message, `drop_newest` the new one
+    and `raise` raises `OutboxFull`.
+    With `path` messages beyond `maxsize` are spilled to a file instead of dropped.
+    `path` is a prefix, every outbox writes its own `<path>.<pid>.<n>` file,
+    created empty so messages of a previous run are not replayed and removed once
+    the outbox is collected or the process exits.
+    """
+
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    RAISE = "raise"
+
+    POLICIES = (DROP_OLDEST, DROP_NEWEST, RAISE)
+
+    # numbers outboxes of a process so each gets its own spill file
+    _instances = count()
+
+    def __init__(
+        self,
+        maxsize: int,
+        overflow: str = DROP_OLDEST,
+        path: str | None = None,
+    ):
+        assert overflow in self.POLICIES, "unknown overflow policy %s" % overflow
+
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.path = (
+            None
+            if path is None
+            else "%s.%d.%d" % (path, os.getpid(), next(self._instances))
+        )
+
+        self.dropped = 0
+        self.drained = 0
+
+        self._queue: Deque[Entry] = deque()
+        self._lock = Lock()
+
+        # records in the spill file and offset of the first one not loaded yet
+        self._spilled = 0
+        self._offset = 0
+
+        if self.path is not None:
+            open(self.path, "wb").close()
+            weakref.finalize(self, _remove, self.path)
+
+    @classmethod
+    def from_settings(
+        cls,
+        maxsize: int = None,
+        overflow: str = None,
+        path: str = None,
+    ) -> Optional["Outbox"]:
+        """
+        Outbox with `MANAGER_OUTBOX_*` settings as defaults, `None` when `maxsize` is 0
+        """
+        if maxsize is None:
+            maxsize = jira_settings.MANAGER_OUTBOX_SIZE
+
+        if not maxsize:
+            return None
+
+        return cls(
+            maxsize,
+            overflow or jira_settings.MANAGER_OUTBOX_OVERFLOW,
+            path or jira_settings.MANAGER_OUTBOX_PATH,
+        )
+
+    def __len__(self):
+        return len(self._queue) + self._spilled
+
+    @property
+    def stats(self):
+        with self._lock:
+            oldest = self._queue[0][0] if self._queue else None
+
+            return dict(
+                size=len(self),
+                spilled=self._spilled,
+                oldest_age=time() - oldest if oldest is not None else 0,
+                dropped=self.dropped,
+                drained=self.drained,
+            )
+
+    def put(self, channel: str, data: bytes):
+        entry = (time(), channel, data)
+
+        with self._lock:
+            # once spilling, later messages follow in the file to keep the order
+            if self._spilled or len(self._queue) >= self.maxsize:
+                if self.path is not None:
+                    return self._spill(entry)
+
+                if self.overflow == self.RAISE:
+                    raise OutboxFull("outbox is full, %d messages" % len(self))
+
+                self.dropped += 1
+
+                if self.overflow == self.DROP_NEWEST:
+                    return
+
+                self._queue.popleft()
+
+            self._queue.append(entry)
+
+    def peek(self) -> Optional[Entry]:
+        """
+        Oldest message, left in the outbox until `pop` once published
+        """
+        with self._lock:
+            if not self._queue and self._spilled:
+                self._load()
+
+            return self._queue[0] if self._queue else None
+
+    def pop(self):
+        with self._lock:
+            self._queue.popleft()
+            self.drained += 1
+
+    def _spill(self, entry: Entry):
+        timestamp, channel, data = entry
+        channel = channel.encode()
+
+        with open(self.path, "ab") as file:
+            file.write(HEADER.pack(timestamp, len(channel), len(data)))
+            file.write(channel)
+            file.write(data)
+
+        self._spilled += 1
+
+    def _load(self):
+        """
+        Move up to `maxsize` spilled messages back to memory
+        """
+        with open(self.path, "rb") as file:
+            file.seek(self._offset)
+
+            while self._spilled and len(self._queue) < self.maxsize:
+                timestamp, channel_size, data_size = HEADER.unpack(
+                    file.read(HEADER.size)
+                )
+                channel = file.read(channel_size).decode()
+
+                self._queue.append((timestamp, channel, file.read(data_size)))
+                self._spilled -= 1
+
+            self._offset = file.tell()
+
+        if not self._spilled:
+            # every record loaded, start the file over
+            os.truncate(self.path, 0)
+            self._offset = 0
@@ -1,28 +1,172 @@
-from threading import Thread
-from typing import Generator
+import logging
+
+from threading import Condition, Thread
+from time import monotonic
+from typing import Dict, Generator, List
+
+from djira.settings import jira_settings
+
 from .base_manager import BaseManager
+from .codec import Codec
+
+logger = logging.getLogger(__name__)
 
 
 class PubSubManager(BaseManager):
-    def __init__(self):
-        super().__init__()
+    """
+    Messages are published one by one unless `batch_interval` (seconds) is set,
+    then they are collected for up to `batch_interval` or `batch_size` messages
+    and published as a single `{"batch": [...]}` envelope.
+    """
+
+    def __init__(
+        self,
+        batch_interval: float = None,
+        batch_size: int = None,
+        codec: Codec | None = None,
+    ):
+        super().__init__(codec)
+
+        self.batch_interval = (
+            jira_settings.MANAGER_BATCH_INTERVAL
+            if batch_interval is None
+            else batch_interval
+        )
+        self.batch_size = batch_size or jira_settings.MANAGER_BATCH_SIZE
+
+        self.batches = 0
+        self.batched = 0
+        self.max_batch_size = 0
+        self.flush_latency = 0.0
+        self.max_flush_latency = 0.0
+
+        self._batch: List[dict] = []
+        self._batch_started = 0.0
+        self._batch_condition = Condition()
+        self._batch_thread: Thread | None = None
 
         self.initialize()
 
+    @property
+    def batch_stats(self):
+        return dict(
+            batches=self.batches,
+            messages=self.batched,
+            avg_batch_size=self.batched / self.batches if self.batches else 0,
+            max_batch_size=self.max_batch_size,
+            avg_flush_latency=self.flush_latency / self.batches if self.batches else 0,
+            max_flush_latency=self.max_flush_latency,
+        )
+
     def send_data(
         self,
         data: dict,
         filter: dict | None,
+        room: str | None = None,
     ):
         """
-        Send data to all subscribing clients
+        Send data to all subscribing clients,
+        with shards only nodes watching `room` receive it
         """
         payload = dict(
             data=data,
             filter=filter,
         )
 
-        return self._publish(payload)
+        if self.get_shard(room) is not None:
+            payload["room"] = room
+
+        if not self.batch_interval:
+            return self._publish(payload)
+
+        with self._batch_condition:
+            if not self._batch:
+                self._batch_started = monotonic()
+
+            self._batch.append(payload)
+
+            self._start_batch_thread()
+
+            # one thread publishes batches so they are sent in order
+            if len(self._batch) == 1 or len(self._batch) >= self.batch_size:
+                self._batch_condition.notify()
+
+    def flush(self):
+        """
+        Publish collected messages now
+        """
+        with self._batch_condition:
+            while self._batch:
+                self._publish_batch(*self._take_batch())
+
+    def _take_batch(self):
+        if not self._batch:
+            return None
+
+        batch = self._batch[: self.batch_size]
+        started = self._batch_started
+
+        self._batch = self._batch[self.batch_size :]
+        self._batch_started = monotonic()
+
+        return batch, started
+
+    def _publish_batch(self, batch: List[dict], started: float):
+        latency = monotonic() - started
+
+        self.batches += 1
+        self.batched += len(batch)
+        self.max_batch_size = max(self.max_batch_size, len(batch))
+        self.flush_latency += latency
+        self.max_flush_latency = max(self.max_flush_latency, latency)
+
+        for shard_batch in self._split_batch(batch):
+            if len(shard_batch) == 1:
+                self._publish(shard_batch[0])
+                continue
+
+            envelope = {"batch": shard_batch}
+
+            # a batch holds messages of one shard, routed like its first message
+            if "room" in shard_batch[0]:
+                envelope["room"] = shard_batch[0]["room"]
+
+            self._publish(envelope)
+
+    def _split_batch(self, batch: List[dict]) -> List[List[dict]]:
+        if self.shards <= 1:
+            return [batch]
+
+        shards: Dict[int | None, List[dict]] = {}
+
+        for payload in batch:
+            shards.setdefault(self.get_shard(payload.get("room")), []).append(payload)
+
+        return list(shards.values())
+
+    def _start_batch_thread(self):
+        if self._batch_thread is None:
+            self._batch_thread = Thread(target=self._batch_loop, daemon=True)
+            self._batch_thread.start()
+
+    def _batch_loop(self):
+        while True:
+            with self._batch_condition:
+                while not self._batch:
+                    self._batch_condition.wait()
+
+                timeout = self._batch_started + self.batch_interval - monotonic()
+
+                if timeout > 0 and len(self._batch) < self.batch_size:
+                    self._batch_condition.wait(timeout)
+                    continue
+
+                batch = self._take_batch()
+
+            try:
+                self._publish_batch(*batch)
+            except Exception:
+                logger.exception("failed to publish batch")
 
     def initialize(self):
         thread = Thread(target=self._thread)
@@ -46,8 +190,24 @@ class PubSubManager(BaseManager):
         """
         raise NotImplementedError()
 
+    def _on_message(self, message: dict):
+        """
+        Decode a message received from the broker and trigger listeners
+        """
+        try:
+            payload = self.codec.decode(message["data"])
+        except Exception:
+            # a message this node can't read must not stop listening
+            logger.exception("failed to decode message, dropping it")
+            return None
+
+        return self._on_data(payload)
+
     def _thread(self):
         for message in self._listen():
-            self._on_data(message)
+            try:
+                self._on_message(message)
+            except Exception:
+                logger.exception("failed to handle message")
 
         self._unsubscribe()
@@ -1,15 +1,54 @@
-from typing import Callable, List, Optional
+import logging
+
+from typing import Callable, Dict, List, Optional, Set
 
-import json
 from time import sleep
 from functools import partial
+from threading import Event, Lock, Thread
 
-from redis import Redis
+from redis import BlockingConnectionPool, ConnectionPool, Redis
 from redis.client import PubSub
 from redis.exceptions import RedisError
 
+from djira.settings import jira_settings
+
+from .outbox import Outbox
 from .pubsub_manager import PubSubManager
 
+logger = logging.getLogger(__name__)
+
+
+def create_pools(
+    pool_class: type,
+    url: str,
+    max_connections: int = None,
+    health_check_interval: int = None,
+    pool_timeout: float = None,
+) -> tuple:
+    """
+    Publishing pool of up to `max_connections` and a small reading pool,
+    idle connections are checked with a `PING` every `health_check_interval` seconds.
+    `pool_class` is a sync or asyncio blocking pool, when every connection is in use
+    publishers wait up to `pool_timeout` seconds instead of failing.
+    """
+    if health_check_interval is None:
+        health_check_interval = jira_settings.MANAGER_HEALTH_CHECK_INTERVAL
+
+    options = dict(
+        health_check_interval=health_check_interval,
+        socket_keepalive=True,
+        timeout=pool_timeout or jira_settings.MANAGER_POOL_TIMEOUT,
+    )
+
+    publish_pool = pool_class.from_url(
+        url,
+        max_connections=max_connections or jira_settings.MANAGER_MAX_CONNECTIONS,
+        **options,
+    )
+    subscribe_pool = pool_class.from_url(url, max_connections=2, **options)
+
+    return publish_pool, subscribe_pool
+
 
 class RedisManager(PubSubManager):
     """
@@ -20,43 +59,236 @@ class RedisManager(PubSubManager):
     manager = RedisManager.connect_from_url(url)
     manager.listen(on_scope_subscribe_to_room)
     # add optional filter to reduce listen to data from pub
+
+    With `shards` room messages are published to one of `shards` channels picked by
+    a hash of the room, a node only listens to the shards of rooms it has subscribers in.
+    Messages without a room are published to `channel_key` every node listens to.
+
+    Messages that can't be published are kept in an outbox of up to `outbox_size` messages
+    and published in order once Redis is back, see `Outbox`.
     """
 
     redis: Redis
     pubsub: PubSub
 
-    def __init__(self, connect: Callable):
+    # client reading messages, its pool is separate from publishing
+    subscriber: Redis
+
+    def __init__(
+        self,
+        connect: Callable,
+        shards: int = None,
+        outbox_size: int = None,
+        outbox_overflow: str = None,
+        outbox_path: str = None,
+        **kwargs,
+    ):
+        self.shards = shards or jira_settings.MANAGER_SHARDS
+        self.outbox = Outbox.from_settings(outbox_size, outbox_overflow, outbox_path)
+        self._outbox_event = Event()
+        self._outbox_thread: Thread | None = None
+
+        # watched rooms and their number by shard
+        self._watched: Set[str] = set()
+        self._watched_shards: Dict[int, int] = {}
+        self._watch_lock = Lock()
+
+        # shard subscriptions to change, applied by the listening thread
+        # since `PubSub` is not thread safe, `True` to subscribe
+        self._shard_changes: Dict[int, bool] = {}
+
         self._connect = partial(connect, self)
         self._connect()
 
-        super().__init__()
+        super().__init__(**kwargs)
 
     @classmethod
-    def connect_from_url(cls, url: str):
+    def connect_from_url(
+        cls,
+        url: str,
+        max_connections: int = None,
+        health_check_interval: int = None,
+        pool_timeout: float = None,
+        **kwargs,
+    ):
+        """
+        Connect with pools created once, reconnecting reuses them, see `create_pools`
+        """
+        publish_pool, subscribe_pool = create_pools(
+            BlockingConnectionPool,
+            url,
+            max_connections,
+            health_check_interval,
+            pool_timeout,
+        )
+
         def connect(self: "RedisManager"):
-            self.redis = Redis.from_url(url)
-            self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
-            self.pubsub.subscribe(self.channel_key)
+            self.connect_pools(publish_pool, subscribe_pool)
+
+        return cls(connect, **kwargs)
+
+    def connect_pools(
+        self, publish_pool: ConnectionPool, subscribe_pool: ConnectionPool
+    ):
+        """
+        Create clients on first connect, afterwards only subscribe again
+        """
+        if not hasattr(self, "redis"):
+            self.redis = Redis(connection_pool=publish_pool)
+            self.subscriber = Redis(connection_pool=subscribe_pool)
+
+        if hasattr(self, "pubsub"):
+            # release the broken connection back to the pool
+            try:
+                self.pubsub.close()
+            except RedisError:
+                pass
+
+        with self._watch_lock:
+            self._shard_changes.clear()
+            shards = list(self._watched_shards)
+
+        self.pubsub = self.subscriber.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(self.channel_key, *map(self.get_channel, shards))
+
+    def get_channel(self, shard: int | None) -> str:
+        if shard is None:
+            return self.channel_key
+
+        return "%s:%d" % (self.channel_key, shard)
+
+    def watch(self, room: str):
+        shard = self.get_shard(room)
+
+        if shard is None:
+            return
+
+        with self._watch_lock:
+            if room in self._watched:
+                return
+
+            self._watched.add(room)
+            self._watched_shards[shard] = self._watched_shards.get(shard, 0) + 1
+
+            if self._watched_shards[shard] == 1:
+                self._shard_changes[shard] = True
+
+    def unwatch(self, room: str):
+        shard = self.get_shard(room)
 
-        return cls(connect)
+        with self._watch_lock:
+            if room not in self._watched:
+                return
+
+            self._watched.remove(room)
+            self._watched_shards[shard] -= 1
+
+            if self._watched_shards[shard] == 0:
+                del self._watched_shards[shard]
+                self._shard_changes[shard] = False
+
+    def _apply_shard_changes(self):
+        """
+        Subscribe to newly watched shards and leave unwatched ones,
+        called by the listening thread between reads
+        """
+        with self._watch_lock:
+            changes, self._shard_changes = self._shard_changes, {}
+
+        subscribe = [self.get_channel(shard) for shard, on in changes.items() if on]
+        unsubscribe = [
+            self.get_channel(shard) for shard, on in changes.items() if not on
+        ]
+
+        # a failure reconnects, subscribing again to every watched shard
+        if subscribe:
+            self.pubsub.subscribe(*subscribe)
+
+        if unsubscribe:
+            self.pubsub.unsubscribe(*unsubscribe)
 
     def _unsubscribe(self):
         return self.pubsub.unsubscribe()
 
+    @property
+    def outbox_stats(self):
+        return self.outbox.stats if self.outbox is not None else None
+
     def _publish(self, data: dict):
+        encoded = self.codec.encode(data)
+        channel = self.get_channel(self.get_shard(data.get("room")))
+
+        # queue behind the backlog so messages are published in order
+        if self.outbox is not None and len(self.outbox):
+            return self._put_outbox(channel, encoded)
+
         retry = False
 
         while True:
             try:
-                if retry:
-                    self._connect()
-                return self.redis.publish(self.channel_key, json.dumps(data))
+                # pooled clients reconnect on their own, retry once on a fresh connection
+                return self._send(encoded, channel)
             except RedisError as error:
                 if not retry:
                     retry = True
                     continue
 
-                raise RedisError() from error
+                if self.outbox is None:
+                    raise RedisError() from error
+
+                logger.warning("failed to publish message, keeping it in outbox")
+
+                return self._put_outbox(channel, encoded)
+
+    def _put_outbox(self, channel: str, data: bytes):
+        self.outbox.put(channel, data)
+
+        if self._outbox_thread is None:
+            self._outbox_thread = Thread(target=self._drain_outbox, daemon=True)
+            self._outbox_thread.start()
+
+        self._outbox_event.set()
+
+    def _drain_outbox(self):
+        retry_sleep = 0.1
+
+        while True:
+            entry = self.outbox.peek()
+
+            if entry is None:
+                self._outbox_event.wait()
+                self._outbox_event.clear()
+                continue
+
+            _, channel, data = entry
+
+            try:
+                self._send(data, channel)
+            except RedisError:
+                sleep(retry_sleep)
+                retry_sleep = min(retry_sleep * 2, 1)
+                continue
+
+            retry_sleep = 0.1
+            self.outbox.pop()
+
+    def _send(self, data: bytes, channel: str):
+        return self.redis.publish(channel, data)
+
+    def _messages(self):
+        """
+        Read with a timeout instead of `listen` so idle connections are health checked,
+        with shards a short one so newly watched shards are subscribed quickly
+        """
+        timeout = 1.0 if self.shards <= 1 else 0.1
+
+        while True:
+            self._apply_shard_changes()
+
+            message = self.pubsub.get_message(timeout=timeout)
+
+            if message is not None:
+                yield message
 
     def _listen(self):
         retry_sleep = 1
@@ -67,7 +299,7 @@ class RedisManager(PubSubManager):
                 if connect:
                     self._connect()
                     retry_sleep = 1
-                for message in self.pubsub.listen():
+                for message in self._messages():
                     yield message
             except RedisError:
                 connect = True
@@ -76,8 +308,3 @@ class RedisManager(PubSubManager):
 
                 if retry_sleep > 60:
                     retry_sleep = 60
-
-    def _on_data(self, payload: dict):
-        return super()._on_data(
-            json.loads(payload["data"]),
-        )
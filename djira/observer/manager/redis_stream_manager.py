@@ -0,0 +1,153 @@
+import socket
+
+from threading import Event
+from typing import Callable, Dict, Generator, List, Optional
+
+from redis import ConnectionPool, Redis
+from redis.exceptions import ResponseError
+
+from .redis_manager import RedisManager
+
+
+class RedisStreamManager(RedisManager):
+    """
+    RedisManager on a Redis stream, messages survive a node being disconnected.
+
+    Every node reads the stream with its own consumer group (`group`, defaults to the hostname)
+    so each node receives every message, entries are acknowledged once handled.
+    Entries delivered but not acknowledged before a restart are handled again by `pull`,
+    the stream is capped to about `maxlen` entries.
+
+    manager = RedisStreamManager.connect_from_url(url, group="node-1")
+    manager.subscribe(on_message)
+    manager.pull() # recover pending entries, then start reading
+    """
+
+    def __init__(
+        self,
+        connect: Callable,
+        group: str | None = None,
+        maxlen: int = 10000,
+        count: int = 100,
+        block: int = 1000,
+        **kwargs,
+    ):
+        self.group = group or socket.gethostname()
+        self.maxlen = maxlen
+        self.count = count
+        self.block = block
+
+        # listening starts once listeners are registered and pending entries pulled
+        self._pulled = Event()
+
+        # every node reads the whole stream, rooms are not sharded
+        kwargs["shards"] = 1
+
+        super().__init__(connect, **kwargs)
+
+    def connect_pools(
+        self,
+        publish_pool: ConnectionPool,
+        subscribe_pool: ConnectionPool,
+    ):
+        if not hasattr(self, "redis"):
+            self.redis = Redis(connection_pool=publish_pool)
+            self.subscriber = Redis(connection_pool=subscribe_pool)
+
+        self.create_group()
+
+    def create_group(self):
+        """
+        Create node consumer group, a new group only reads entries added after it
+        """
+        try:
+            self.redis.xgroup_create(
+                self.channel_key, self.group, id="$", mkstream=True
+            )
+        except ResponseError as error:
+            if "BUSYGROUP" not in str(error):
+                raise
+
+    def _unsubscribe(self):
+        pass
+
+    def _send(self, data: bytes, channel: str):
+        return self.redis.xadd(
+            self.channel_key,
+            {"d": data},
+            maxlen=self.maxlen,
+            approximate=True,
+        )
+
+    def _read(self, id: str, block: int | None = None) -> List[Dict]:
+        """
+        Read up to `count` entries of the node group, `id=">"` reads new entries
+        and any other id reads pending entries after it
+        """
+        response = self.subscriber.xreadgroup(
+            self.group,
+            self.group,
+            {self.channel_key: id},
+            count=self.count,
+            block=block,
+        )
+
+        return [
+            {"id": entry_id, "data": fields.get(b"d") if fields else None}
+            for _, entries in response or []
+            for entry_id, fields in entries
+        ]
+
+    def _ack(self, messages: List[Dict]):
+        if messages:
+            self.subscriber.xack(
+                self.channel_key,
+                self.group,
+                *[message["id"] for message in messages],
+            )
+
+    def _messages(self) -> Generator[Dict, None, None]:
+        self._pulled.wait()
+
+        # entries left pending by a lost connection are read again first
+        self.pull()
+
+        while True:
+            messages = self._read(">", self.block)
+
+            for message in messages:
+                if message["data"] is not None:
+                    yield message
+
+            # acknowledged after being handled, the generator resumes once `_on_message` returns
+            self._ack(messages)
+
+    def _pull_data(self) -> List[Dict]:
+        messages = []
+        last_id = "0"
+
+        while True:
+            entries = self._read(last_id)
+
+            if not entries:
+                return messages
+
+            messages += entries
+            last_id = entries[-1]["id"]
+
+    def pull(self) -> Optional[List[Exception]]:
+        """
+        Handle entries delivered to this node but never acknowledged, then start listening
+        `Note: call this only after all listeners have been registered.`
+        """
+        errors = []
+        messages = self._pull_data()
+
+        for message in messages:
+            if message["data"] is not None:
+                errors += self._on_message(message) or []
+
+        self._ack(messages)
+        self._pulled.set()
+
+        return errors if len(errors) > 0 else None
@@ -1,10 +1,16 @@
-from django.db.models import Model
-from django.db.models.signals import post_save, post_delete
+from copy import deepcopy
+from typing import Any, Iterable, List, Set
+
+from django.db.models import DEFERRED, Model, QuerySet
+from django.db.models.signals import post_init, post_save, post_delete
 from rest_framework.serializers import Serializer
 from socketio import AsyncServer
 
+from djira.settings import jira_settings
+
 from .base_observer import Action
 from .signal_observer import SignalObserver
+from .transaction import TransactionBatch
 
 
 class ModelObserver(SignalObserver):
@@ -13,8 +19,29 @@ class ModelObserver(SignalObserver):
         sender: Model,
         serializer_class: Serializer = None,
         server: AsyncServer = None,
+        on_commit: bool | None = None,
+        delta: bool | List[str] = False,
+        skip_unchanged: bool = True,
+        **kwargs,
     ):
-        super().__init__(sender, serializer_class, server)
+        super().__init__(sender, serializer_class, server, **kwargs)
+
+        self.on_commit = (
+            jira_settings.OBSERVER_ON_COMMIT if on_commit is None else on_commit
+        )
+        self.delta = delta
+        self.skip_unchanged = skip_unchanged
+
+        # instances are snapshot when loaded in delta mode or once subscriptions filter fields
+        self._snapshot_attr = "_djira_snapshot_%s" % id(self)
+        self._snapshots = False
+        self._delta_fields = {
+            field.attname: field.name
+            for field in sender._meta.concrete_fields
+            if delta
+            and not field.primary_key
+            and (delta is True or field.name in delta)
+        }
 
     def connect(self):
         post_save.connect(
@@ -29,15 +56,155 @@ class ModelObserver(SignalObserver):
             dispatch_uid=id(self),
         )
 
+        if self.delta:
+            self.connect_snapshots()
+
         return self
 
-    def post_save_receiver(self, created: bool, **kwargs):
+    def connect_snapshots(self):
+        if not self._snapshots:
+            self._snapshots = True
+            post_init.connect(
+                self.post_init_receiver,
+                self.sender,
+                dispatch_uid=id(self),
+            )
+
+    def track_filter_fields(self, attnames: Set[str]):
+        super().track_filter_fields(attnames)
+        self.connect_snapshots()
+
+    def get_snapshot(self, instance: Model):
+        """
+        Values of tracked and filtered fields loaded on instance, deferred fields are skipped.
+        Mutable values (e.g. JSONField) are deep copied so in place changes are detected.
+        """
+        return {
+            attname: deepcopy(value) if isinstance(value, (dict, list)) else value
+            for attname in self._delta_fields.keys() | self.filter_attnames
+            if (value := instance.__dict__.get(attname, DEFERRED)) is not DEFERRED
+        }
+
+    def get_changed_fields(self, instance: Model) -> Set[str]:
+        """
+        Names of tracked fields changed since the last snapshot
+        """
+        snapshot = getattr(instance, self._snapshot_attr, {})
+
+        return {
+            name
+            for attname, name in self._delta_fields.items()
+            if (value := instance.__dict__.get(attname, DEFERRED)) is not DEFERRED
+            and (attname not in snapshot or snapshot[attname] != value)
+        }
+
+    def post_init_receiver(self, instance: Model, **kwargs):
+        setattr(instance, self._snapshot_attr, self.get_snapshot(instance))
+
+    def post_save_receiver(self, created: bool, instance: Model, **kwargs):
         if created:
             action = Action.CREATE
         else:
             action = Action.UPDATE
 
-        self.dispatch(action=action, created=created, **kwargs)
+        previous = getattr(instance, self._snapshot_attr, None)
+
+        if self.delta:
+            changed_fields = self.get_changed_fields(instance)
+
+        if self._snapshots:
+            self.post_init_receiver(instance)
+
+        if action == Action.UPDATE:
+            if self.delta:
+                if not changed_fields and self.skip_unchanged:
+                    return
+
+                kwargs["changed_fields"] = changed_fields
+
+            # filtered subscribers are told when the instance enters or leaves their filter
+            if previous is not None and self.filter_attnames:
+                kwargs["previous"] = previous
+
+        self.receive(action=action, instance=instance, created=created, **kwargs)
 
     def post_delete_receiver(self, **kwargs):
-        self.dispatch(action=Action.DELETE, **kwargs)
+        self.receive(action=Action.DELETE, **kwargs)
+
+    def receive(self, action: Action, instance: Model, **kwargs):
+        """
+        Dispatch model event, when `on_commit` is set events are buffered
+        until the transaction commits and coalesced per instance
+        """
+        if self.on_commit:
+            return TransactionBatch.dispatch(self, action, instance, **kwargs)
+
+        return self.dispatch(action=action, instance=instance, **kwargs)
+
+    def serialize_event(self, action: Action, instance: Model, context: dict, **kwargs):
+        """
+        In delta mode `Action.UPDATE` only sends changed fields and pk
+        """
+        data = super().serialize_event(action, instance, context, **kwargs)
+        changed_fields = kwargs.get("changed_fields")
+
+        if (
+            action != Action.UPDATE
+            or changed_fields is None
+            or not isinstance(data, dict)
+        ):
+            return data
+
+        keys = changed_fields | {"pk", self.sender._meta.pk.name}
+
+        return {key: value for key, value in data.items() if key in keys}
+
+    def notify_bulk(self, action: Action, objects: QuerySet | Iterable[Model | Any]):
+        """
+        Notify subscribers of a bulk change such as `bulk_create`, `bulk_update`,
+        `QuerySet.update` or `QuerySet.delete`, which don't send model signals.
+        `objects` is a queryset, instances or pks, pks are loaded with a single query.
+        For `Action.DELETE` pass the queryset before deleting or the deleted pks.
+        Each room receives one event with the list of serialized instances.
+        ```
+        pks = list(queryset.values_list("pk", flat=True))
+        queryset.update(is_active=False)
+        observer.notify_bulk(Action.UPDATE, pks)
+        ```
+        """
+
+        instances = self.get_bulk_instances(action, objects)
+
+        if self.locality:
+            return self.publish_event(action, instances, many=True)
+
+        if self.dispatch_queue is None:
+            return self.perform_bulk_dispatch(action, instances)
+
+        return self.dispatch_queue.put(
+            self.perform_bulk_dispatch,
+            action,
+            instances,
+            key=self.get_dispatch_key(instances),
+        )
+
+    def get_bulk_instances(
+        self,
+        action: Action,
+        objects: QuerySet | Iterable[Model | Any],
+    ) -> List[Model]:
+        if isinstance(objects, QuerySet):
+            return list(objects)
+
+        objects = list(objects)
+        pks = [item for item in objects if not isinstance(item, Model)]
+
+        if not pks:
+            return objects
+
+        if action == Action.DELETE:
+            instances = [self.sender(pk=pk) for pk in pks]
+        else:
+            instances = list(self.sender._default_manager.filter(pk__in=pks))
+
+        return [item for item in objects if isinstance(item, Model)] + instances
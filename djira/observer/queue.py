@@ -0,0 +1,198 @@
+import asyncio
+import logging
+
+from concurrent.futures import TimeoutError
+
+from functools import partial
+from itertools import count
+from typing import Callable, Hashable, List, Literal
+
+from djira.db import database_sync_to_async
+from djira.settings import jira_settings
+
+logger = logging.getLogger(__name__)
+
+
+class DispatchQueue:
+    """
+    Bounded queue running observer dispatches off the thread that triggered them.
+
+    Jobs are consumed by `concurrency` asyncio workers on the server event loop,
+    each job runs in a worker thread so it can use the ORM.
+    Every worker has its own queue, jobs put with the same `key` (e.g. observer
+    and pk) go to the same worker so they run in the order they are put.
+    When the queue is full `policy="drop"` discards the job and `policy="block"`
+    makes the caller wait up to `timeout` seconds for a free slot.
+    Until a loop is attached jobs run inline.
+    """
+
+    loop: asyncio.AbstractEventLoop | None = None
+    queues: List["DispatchQueue"] = []
+
+    def __init__(
+        self,
+        maxsize: int = None,
+        concurrency: int = None,
+        policy: Literal["drop", "block"] = None,
+        timeout: float | None = None,
+    ):
+        self.maxsize = maxsize or jira_settings.DISPATCH_QUEUE_SIZE
+        self.concurrency = concurrency or jira_settings.DISPATCH_QUEUE_CONCURRENCY
+        self.policy = policy or jira_settings.DISPATCH_QUEUE_POLICY
+        self.timeout = timeout
+
+        assert self.policy in ("drop", "block"), "policy must be `drop` or `block`"
+
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.max_depth = 0
+
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._queues: List[asyncio.Queue] = []
+        self._workers: List[asyncio.Task] = []
+
+        # spreads jobs without a key over the workers
+        self._next = count()
+
+        self.queues.append(self)
+
+        if self.loop is not None:
+            self.start(self.loop)
+
+    @classmethod
+    def default(cls) -> "DispatchQueue":
+        """
+        Queue shared by observers created with `dispatch_queue=True`
+        """
+        if not hasattr(cls, "_default"):
+            cls._default = cls()
+
+        return cls._default
+
+    @classmethod
+    def attach(cls, loop: asyncio.AbstractEventLoop):
+        """
+        Attach all dispatch queues to the server event loop
+        """
+        if cls.loop is loop:
+            return
+
+        DispatchQueue.loop = loop
+
+        for queue in cls.queues:
+            queue.start(loop)
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        if self._loop is loop:
+            return
+
+        self._loop = loop
+
+        def _start():
+            maxsize = max(1, self.maxsize // self.concurrency)
+
+            self._queues = [asyncio.Queue(maxsize) for _ in range(self.concurrency)]
+            self._workers = [
+                loop.create_task(self._worker(queue)) for queue in self._queues
+            ]
+
+        if self._in_loop():
+            _start()
+        else:
+            loop.call_soon_threadsafe(_start)
+
+    @property
+    def depth(self) -> int:
+        return sum(queue.qsize() for queue in self._queues)
+
+    @property
+    def stats(self):
+        return dict(
+            depth=self.depth,
+            max_depth=self.max_depth,
+            enqueued=self.enqueued,
+            processed=self.processed,
+            dropped=self.dropped,
+            failed=self.failed,
+        )
+
+    def _in_loop(self):
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def put(self, func: Callable, *args, key: Hashable = None, **kwargs) -> bool:
+        """
+        Queue `func(*args, **kwargs)` after jobs put with the same `key`.
+        Return `False` if the job was dropped, a job put from another thread
+        with `policy="drop"` is queued later on the loop so its drop is only counted.
+        """
+        job = partial(func, *args, **kwargs)
+
+        if self._loop is None or self._loop.is_closed():
+            job()
+            return True
+
+        index = (next(self._next) if key is None else hash(key)) % self.concurrency
+
+        if self.policy == "block" and not self._in_loop():
+            future = asyncio.run_coroutine_threadsafe(self._put(job, index), self._loop)
+
+            try:
+                future.result(self.timeout)
+            except TimeoutError:
+                future.cancel()
+                self.dropped += 1
+                return False
+
+            return True
+
+        if self._in_loop():
+            return self._put_nowait(job, index)
+
+        self._loop.call_soon_threadsafe(self._put_nowait, job, index)
+
+        return True
+
+    async def _put(self, job: Callable, index: int):
+        await self._queues[index].put(job)
+        self._enqueued()
+
+    def _put_nowait(self, job: Callable, index: int):
+        try:
+            self._queues[index].put_nowait(job)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning("dispatch queue is full, dropping event")
+            return False
+
+        self._enqueued()
+
+        return True
+
+    def _enqueued(self):
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, self.depth)
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            job = await queue.get()
+
+            try:
+                await database_sync_to_async(job, thread_sensitive=False)()
+                self.processed += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("dispatch queue job failed")
+            finally:
+                queue.task_done()
+
+    async def join(self):
+        """
+        Wait until all queued jobs are processed
+        """
+        for queue in self._queues:
+            await queue.join()
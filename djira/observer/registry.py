@@ -0,0 +1,148 @@
+from typing import Callable, Dict, Iterator, List, Set, Tuple
+
+from .subscription import Subscription
+
+SubscriptionKey = Tuple[str, str, str]
+
+
+class SubscriptionRegistry:
+    """
+    Room subscriptions keyed by room and then by `(sid, namespace, requestId)`,
+    with a reverse index by sid.
+
+    Every operation touches only the entries it affects, so disconnecting a
+    sid costs time proportional to that sid's own subscriptions instead of
+    the whole table. Participants of a room are returned in subscription order.
+    """
+
+    def __init__(self):
+        self._rooms: Dict[str, Dict[SubscriptionKey, Subscription]] = {}
+        self._sids: Dict[str, Set[Tuple[str, SubscriptionKey]]] = {}
+        # number of subscriptions per `(namespace, action)` in a room
+        self._channels: Dict[str, Dict[Tuple[str, str], int]] = {}
+
+    def add(self, room_name: str, subscription: Subscription) -> bool:
+        """
+        Add subscription to room, return `False` if the subscription already exist
+        """
+        key = subscription.key
+        subscriptions = self._rooms.setdefault(room_name, {})
+
+        if key in subscriptions:
+            return False
+
+        subscriptions[key] = subscription
+        self._sids.setdefault(subscription.sid, set()).add((room_name, key))
+
+        channels = self._channels.setdefault(room_name, {})
+        channel = (subscription.namespace, subscription.action)
+        channels[channel] = channels.get(channel, 0) + 1
+
+        return True
+
+    def remove(self, room_name: str, subscription: Subscription) -> bool:
+        """
+        Remove subscription from room, return `True` if it was subscribed to room
+        """
+        return self._remove(room_name, subscription.key, subscription.sid)
+
+    def _remove(self, room_name: str, key: SubscriptionKey, sid: str) -> bool:
+        if not self._pop(room_name, key):
+            return False
+
+        entries = self._sids.get(sid)
+
+        if entries is not None:
+            entries.discard((room_name, key))
+
+            if not entries:
+                del self._sids[sid]
+
+        return True
+
+    def remove_sid(self, sid: str) -> Set[str]:
+        """
+        Remove all subscriptions owned by sid, return rooms sid was removed from
+        """
+        rooms = set()
+
+        for room_name, key in self._sids.pop(sid, ()):
+            if self._pop(room_name, key):
+                rooms.add(room_name)
+
+        return rooms
+
+    def _pop(self, room_name: str, key: SubscriptionKey) -> bool:
+        subscriptions = self._rooms.get(room_name)
+        subscription = subscriptions.pop(key, None) if subscriptions else None
+
+        if subscription is None:
+            return False
+
+        if not subscriptions:
+            del self._rooms[room_name]
+
+        channels = self._channels[room_name]
+        channel = (subscription.namespace, subscription.action)
+        channels[channel] -= 1
+
+        if not channels[channel]:
+            del channels[channel]
+
+            if not channels:
+                del self._channels[room_name]
+
+        return True
+
+    def remove_where(self, predicate: Callable[[Subscription], bool]) -> Set[str]:
+        """
+        Remove all subscriptions matching predicate, this scans every room
+        """
+        rooms = set()
+
+        for room_name, subscriptions in list(self._rooms.items()):
+            for key, subscription in list(subscriptions.items()):
+                if predicate(subscription) and self._remove(
+                    room_name, key, subscription.sid
+                ):
+                    rooms.add(room_name)
+
+        return rooms
+
+    def participants(self, room_name: str) -> List[Subscription]:
+        """
+        Get all subscriptions of room
+        """
+        subscriptions = self._rooms.get(room_name)
+
+        return list(subscriptions.values()) if subscriptions else []
+
+    def rooms_for(self, sid: str) -> Set[str]:
+        """
+        Get all rooms sid is subscribed to
+        """
+        return {room_name for room_name, _ in self._sids.get(sid, ())}
+
+    def channels(self, room_name: str) -> List[Tuple[str, str]]:
+        """
+        Get distinct `(namespace, action)` pairs subscribed to room
+        """
+        return list(self._channels.get(room_name, ()))
+
+    def size(self, room_name: str) -> int:
+        """
+        Get number of subscriptions in room
+        """
+        return len(self._rooms.get(room_name, ()))
+
+    def rooms(self) -> Iterator[str]:
+        """
+        Iterate rooms with at least one subscription
+        """
+        return iter(list(self._rooms))
+
+    def __contains__(self, room_name: str):
+        return room_name in self._rooms
+
+    def __len__(self):
+        return sum(map(len, self._rooms.values()))
@@ -0,0 +1,160 @@
+import json
+
+from collections import OrderedDict, deque
+from threading import Lock
+from time import time
+from typing import Any, Deque, Dict, List, Tuple
+
+from redis import Redis
+
+from djira.settings import jira_settings
+
+# (seq, action, pk or list of pks)
+Event = Tuple[int, str, Any]
+
+
+class ReplayBuffer:
+    """
+    Per room sequence numbers and a ring buffer of the last `size` events of each room.
+
+    Only the action and pks are kept, replayed instances are loaded and serialized
+    again so clients resuming with `since` receive the current state.
+
+    At most `max_rooms` rooms are kept, the room written least recently is evicted.
+    Sequences of rooms created afterwards start above every evicted sequence,
+    so clients resuming an evicted room are told to refresh.
+
+    The buffer is local to the process, it can't number events published
+    between nodes in locality mode, use `RedisReplayBuffer` there.
+    """
+
+    # whether every node reads and numbers events from the same buffer
+    shared = False
+
+    def __init__(self, size: int, max_rooms: int = None):
+        self.size = size
+        self.max_rooms = max_rooms or jira_settings.REPLAY_BUFFER_ROOMS
+
+        self._events: Dict[str, Deque[Event]] = {}
+        self._seqs: OrderedDict[str, int] = OrderedDict()
+        self._lock = Lock()
+
+        # highest sequence of an evicted room
+        self._floor = 0
+
+    def append(self, room: str, action: str, pk: Any) -> int:
+        """
+        Record event in room, return its sequence number
+        """
+        with self._lock:
+            seq = self._seqs.get(room, self._floor) + 1
+            self._seqs[room] = seq
+            self._seqs.move_to_end(room)
+
+            events = self._events.get(room)
+
+            if events is None:
+                events = self._events[room] = deque(maxlen=self.size)
+
+            events.append((seq, action, pk))
+
+            while len(self._seqs) > self.max_rooms:
+                evicted, evicted_seq = self._seqs.popitem(last=False)
+                del self._events[evicted]
+
+                self._floor = max(self._floor, evicted_seq)
+
+        return seq
+
+    def last_seq(self, room: str) -> int:
+        return self._seqs.get(room, 0)
+
+    def since(self, room: str, seq: int) -> List[Event] | None:
+        """
+        Events of room after `seq`, `None` when some of them are no longer buffered
+        """
+        with self._lock:
+            return resume(list(self._events.get(room, ())), seq, self.last_seq(room))
+
+
+class RedisReplayBuffer(ReplayBuffer):
+    """
+    Replay buffer shared by all nodes, sequence numbers are `INCR` counters
+    and events are kept in a capped list per room.
+    Keys of a room expire `ttl` seconds after its last event. A room numbers its
+    first event from the current time in milliseconds, so once recreated its sequence
+    is above the one it expired with and clients resuming it are told to refresh.
+    """
+
+    shared = True
+
+    def __init__(
+        self,
+        redis: Redis,
+        size: int,
+        prefix: str = "djira:replay",
+        ttl: int = None,
+    ):
+        self.redis = redis
+        self.size = size
+        self.prefix = prefix
+        self.ttl = ttl or jira_settings.REPLAY_BUFFER_TTL
+
+    @classmethod
+    def from_url(cls, url: str, size: int, **kwargs):
+        return cls(Redis.from_url(url), size, **kwargs)
+
+    def get_keys(self, room: str):
+        return "%s:%s:seq" % (self.prefix, room), "%s:%s:events" % (self.prefix, room)
+
+    def append(self, room: str, action: str, pk: Any) -> int:
+        seq_key, events_key = self.get_keys(room)
+
+        pipeline = self.redis.pipeline()
+        pipeline.set(seq_key, int(time() * 1000), nx=True)
+        pipeline.incr(seq_key)
+        _, seq = pipeline.execute()
+
+        pipeline = self.redis.pipeline()
+        pipeline.rpush(events_key, json.dumps([seq, action, pk], default=str))
+        pipeline.ltrim(events_key, -self.size, -1)
+        pipeline.expire(events_key, self.ttl)
+        pipeline.expire(seq_key, self.ttl)
+        pipeline.execute()
+
+        return seq
+
+    def last_seq(self, room: str) -> int:
+        seq_key, _ = self.get_keys(room)
+
+        return int(self.redis.get(seq_key) or 0)
+
+    def since(self, room: str, seq: int) -> List[Event] | None:
+        seq_key, events_key = self.get_keys(room)
+
+        pipeline = self.redis.pipeline()
+        pipeline.get(seq_key)
+        pipeline.lrange(events_key, 0, -1)
+        last_seq, events = pipeline.execute()
+
+        # nodes may push concurrently, list order is not seq order
+        events = sorted(tuple(json.loads(event)) for event in events)
+
+        return resume(events, seq, int(last_seq or 0))
+
+
+def resume(events: List[Event], seq: int, last_seq: int) -> List[Event] | None:
+    """
+    Events after `seq`, `None` when the buffer rolled over past `seq`
+    or `seq` is ahead of the room (sequence reset)
+    """
+    if seq > last_seq:
+        return None
+
+    if seq == last_seq:
+        return []
+
+    if not events or events[0][0] > seq + 1:
+        return None
+
+    return [event for event in events if event[0] > seq]
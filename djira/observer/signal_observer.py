@@ -1,10 +1,15 @@
+import json
+
+from copy import copy
 from uuid import uuid4
 
 from functools import partial
-from typing import Any, Callable, TypeVar
+from threading import Lock
+from typing import Any, Callable, Dict, FrozenSet, List, Set, Tuple, TypeVar
 
 from asgiref.sync import async_to_sync
 
+from django.core import serializers
 from django.dispatch import Signal
 
 from socketio import AsyncServer
@@ -12,13 +17,19 @@ from socketio import AsyncServer
 from django.db.models import Model
 
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.serializers import Serializer
 
+from djira.cache import TTLCache
 from djira.scope import Scope
 from djira.settings import jira_settings
-from djira._utils import build_context_from_scope
 
-from .base_observer import Action, BaseObserver
+from .base_observer import Action, BaseObserver, FanOut
+from .conflation import Conflator
+from .filters import QueryPredicate, get_query_key
+from .queue import DispatchQueue
+from .replay import ReplayBuffer
+from .subscription import Subscription
 
 T = TypeVar("T")
 
@@ -33,10 +44,65 @@ class SignalObserver(BaseObserver):
         sender: Model,
         serializer_class: Serializer = None,
         server: AsyncServer = None,
+        fan_out: FanOut | str | None = None,
+        context_free: bool | None = None,
+        dispatch_queue: DispatchQueue | bool | None = None,
+        locality: bool | None = None,
+        name: str | None = None,
+        replay: ReplayBuffer | int | None = None,
+        max_rate: float | None = None,
+        debounce: float | None = None,
     ):
         self.sender = sender
         self.serializer_class = serializer_class
         self.server = server or jira_settings.SOCKET_INSTANCE
+        self.fan_out = FanOut(fan_out or jira_settings.OBSERVER_FAN_OUT)
+        self.context_free = context_free
+
+        assert self.fan_out != FanOut.ROOM or self.is_context_free, (
+            "`fan_out=room` serializes once without context, "
+            "the serializer must be context free"
+        )
+
+        self.locality = (
+            jira_settings.SUBSCRIPTION_LOCALITY if locality is None else locality
+        )
+
+        if replay is None:
+            replay = jira_settings.REPLAY_BUFFER_SIZE
+
+        if isinstance(replay, int):
+            replay = ReplayBuffer(replay) if replay > 0 else None
+
+        self.replay = replay
+
+        assert not (self.locality and replay is not None and not replay.shared), (
+            "published events are numbered once by the publishing node, "
+            "locality needs a replay buffer shared by all nodes (`RedisReplayBuffer`)"
+        )
+
+        # compiled subscription filters by query key and the fields they filter
+        self.predicates = TTLCache(1024, 3600)
+        self.filter_attnames: FrozenSet[str] = frozenset()
+        self._filter_lock = Lock()
+
+        self.conflation = (
+            Conflator(self.dispatch_conflated, max_rate=max_rate, debounce=debounce)
+            if max_rate or debounce
+            else None
+        )
+
+        self.name = name or self.get_default_name()
+        assert self.name not in self.observers, "observer `%s` exists" % self.name
+        self.observers[self.name] = self
+
+        if dispatch_queue is None:
+            dispatch_queue = jira_settings.DISPATCH_QUEUE
+
+        if dispatch_queue is True:
+            dispatch_queue = DispatchQueue.default()
+
+        self.dispatch_queue = dispatch_queue or None
 
         super().__init__()
 
@@ -57,47 +123,748 @@ class SignalObserver(BaseObserver):
 
         return _decorator
 
+    def get_default_name(self):
+        """
+        Name events are routed by in locality mode, it must be the same on every node.
+        Defaults to the sender label and creation order, pass `name` to pin it.
+        """
+
+        meta = getattr(self.sender, "_meta", None)
+        label = meta.label_lower if meta else "observer"
+        index = sum(1 for name in self.observers if name.rpartition(":")[0] == label)
+
+        return "%s:%d" % (label, index)
+
     def dispatch(self, action: Action, instance: T, **kwargs):
         """
-        Dipatch event to all subscribing clients
+        Dipatch event to all subscribing clients,
+        in locality mode the event is published to every node instead
+        """
+
+        if self.locality and isinstance(instance, Model):
+            return self.publish_event(action, [instance], **kwargs)
+
+        return self.dispatch_local(action, instance, **kwargs)
+
+    def dispatch_local(self, action: Action, instance: T, **kwargs):
+        """
+        Dispatch event to subscribers of this node,
+        through `dispatch_queue` when set so the caller does not wait for fan-out
+        """
+
+        if self.dispatch_queue is None:
+            return self.perform_dispatch(action, instance, **kwargs)
+
+        # copy so later changes to instance (e.g pk reset on delete) are not seen
+        return self.dispatch_queue.put(
+            self.perform_dispatch,
+            action,
+            copy(instance),
+            key=self.get_dispatch_key(instance),
+            **kwargs,
+        )
+
+    def get_dispatch_key(self, instance: T | List[T]):
+        """
+        Events of an instance are dispatched in order, bulk events in order
+        with other bulk events of the observer
         """
 
-        rooms = self._rooms(action=action, instance=instance, **kwargs)
+        if isinstance(instance, list):
+            return self.name
+
+        return (self.name, getattr(instance, "pk", None))
+
+    def perform_dispatch(
+        self,
+        action: Action,
+        instance: T,
+        rooms: List[str] | None = None,
+        seqs: Dict[str, int] | None = None,
+        **kwargs,
+    ):
+        """
+        Resolve rooms unless given, serialize and emit event,
+        `seqs` are room sequence numbers given by the publishing node
+        """
+
+        if rooms is None:
+            rooms = self._rooms(action=action, instance=instance, **kwargs)
+        serialized = (
+            {}
+        )  # serialized data by action then context key, shared across rooms
 
         for room in rooms:
-            
-            scopes = self.get_participants(room)
+            room_kwargs = kwargs if seqs is None else dict(kwargs, seq=seqs[room])
+
+            if self.conflation is not None and not self.conflation.submit(
+                room, action, instance, **room_kwargs
+            ):
+                continue
+
+            self.dispatch_event(room, action, instance, serialized, **room_kwargs)
+
+    def dispatch_conflated(self, room: str, action: Action, instance: T, **kwargs):
+        """
+        Emit the latest state held by the conflation window of `(room, pk)`,
+        always through a dispatch queue so emits run against the server event loop
+        and not from the conflation thread
+        """
 
-            if hasattr(self, "_participants"):
-                scopes = self._participants(scopes=scopes, instance=instance, action=action)
+        queue = self.dispatch_queue or DispatchQueue.default()
 
-            for scope in scopes:
-                self.emitter(
+        return queue.put(
+            self.dispatch_event,
+            room,
+            action,
+            instance,
+            {},
+            key=self.get_dispatch_key(instance),
+            **kwargs,
+        )
+
+    def dispatch_event(
+        self,
+        room: str,
+        action: Action,
+        instance: T,
+        serialized: dict,
+        seq: int | None = None,
+        previous: Dict[str, Any] | None = None,
+        **kwargs,
+    ):
+        """
+        Number event unless the publishing node did and emit it to room subscribers,
+        `previous` are the filtered field values of instance before an update
+        """
+
+        if seq is None:
+            seq = self.record_event(room, action, instance.pk)
+
+        return self.dispatch_to_room(
+            action,
+            room,
+            instance,
+            lambda scope, action, instance: self.get_data(
+                action, instance, scope, serialized.setdefault(action, {}), **kwargs
+            ),
+            previous=previous,
+            seq=seq,
+        )
+
+    def perform_bulk_dispatch(
+        self,
+        action: Action,
+        instances: List[T],
+        only_rooms: List[str] | None = None,
+        seqs: Dict[str, int] | None = None,
+        **kwargs,
+    ):
+        """
+        Group instances by room, serialize each instance once per context key
+        and emit one event per room, to `only_rooms` when given.
+        `seqs` are room sequence numbers given by the publishing node.
+        """
+
+        rooms = self.group_by_room(action, instances, **kwargs)
+        serialized = {}  # serialized data by pk then context key
+
+        for room, room_instances in rooms.items():
+            if only_rooms is not None and room not in only_rooms:
+                continue
+
+            self.dispatch_to_room(
+                action,
+                room,
+                room_instances,
+                lambda scope, action, room_instances: [
+                    self.get_data(
+                        action,
+                        instance,
+                        scope,
+                        serialized.setdefault(instance.pk, {}),
+                        **kwargs,
+                    )
+                    for instance in room_instances
+                ],
+                many=True,
+                seq=(
+                    self.record_event(
+                        room, action, [instance.pk for instance in room_instances]
+                    )
+                    if seqs is None
+                    else seqs[room]
+                ),
+            )
+
+    def group_by_room(
+        self, action: Action, instances: List[T], **kwargs
+    ) -> Dict[str, List[T]]:
+        rooms: Dict[str, List[T]] = {}
+
+        for instance in instances:
+            for room in self._rooms(action=action, instance=instance, **kwargs):
+                rooms.setdefault(room, []).append(instance)
+
+        return rooms
+
+    def record_event(self, room: str, action: Action, pk: Any) -> int | None:
+        """
+        Add event to the replay buffer, return the room sequence number
+        """
+
+        if self.replay is None:
+            return None
+
+        return self.replay.append(room, action.value, pk)
+
+    def subscribe(self, scope: Scope):
+        """
+        Subscribe scope, a scope resuming with `since` (a room sequence number
+        or a mapping of room to sequence number) receives the events it missed
+        """
+
+        query = scope.query.dict()
+
+        # reject invalid filters before the subscription is sent
+        if query and self.get_predicate(query).conditions:
+            if self.fan_out == FanOut.ROOM:
+                raise ValidationError(
+                    {
+                        "query": [
+                            "subscription filters are not supported with room fan-out"
+                        ]
+                    }
+                )
+
+        result = super().subscribe(scope)
+        since = scope.data.get("since") if isinstance(scope.data, dict) else None
+
+        if self.replay is not None and since is not None:
+            # loads instances and emits, kept off the event loop calling subscribe
+            queue = self.dispatch_queue or DispatchQueue.default()
+            queue.put(self.replay_events, scope, since)
+
+        return result
+
+    def replay_events(self, scope: Scope, since: int | Dict[str, int]):
+        """
+        Emit buffered events after `since` with the current state of instances,
+        emit a `refresh` event for rooms whose buffer rolled over.
+        Uses the ORM and blocking emits, run it from a worker thread.
+        """
+
+        subscription = Subscription.from_scope(scope)
+        context = subscription.get_context()
+        pk_field = self.sender._meta.pk
+        predicate = (
+            self.get_predicate(subscription.query) if subscription.query else None
+        )
+
+        for room in self.get_subscribing_rooms(scope):
+            room_since = since.get(room) if isinstance(since, dict) else since
+
+            if room_since is None:
+                continue
+
+            events = self.replay.since(room, int(room_since))
+
+            if events is None:
+                self.emit_refresh(subscription, room)
+                continue
+
+            instances = self.sender._default_manager.in_bulk(
+                {
+                    pk_field.to_python(pk)
+                    for _, action, pks in events
+                    if action != Action.DELETE.value
+                    for pk in (pks if isinstance(pks, list) else [pks])
+                }
+            )
+
+            for seq, action, pks in events:
+                action = Action(action)
+                many = isinstance(pks, list)
+                pks = [pk_field.to_python(pk) for pk in (pks if many else [pks])]
+                removed = []
+
+                if predicate is not None and action != Action.DELETE:
+                    matched = [
+                        pk
+                        for pk in pks
+                        if pk not in instances or predicate(instances[pk])
+                    ]
+
+                    # the client may hold an updated instance that stopped matching
+                    if action == Action.UPDATE:
+                        removed = [pk for pk in pks if pk not in matched]
+
+                    pks = matched
+
+                for event_action, event_pks in (
+                    (action, pks),
+                    (Action.DELETE, removed),
+                ):
+                    if not event_pks:
+                        continue
+
+                    data = [
+                        self.get_replay_data(event_action, instances, pk, context)
+                        for pk in event_pks
+                    ]
+
+                    self.emitter(
+                        action=event_action,
+                        scope=subscription,
+                        data=data if many else data[0],
+                        many=many,
+                        seq=seq,
+                        room=room,
+                    )
+
+    def get_replay_data(
+        self,
+        action: Action,
+        instances: Dict[Any, Model],
+        pk: Any,
+        context: dict,
+    ):
+        """
+        Serialize current state of a replayed instance, `{"pk": pk}` when it is deleted
+        """
+
+        instance = instances.get(pk)
+
+        if action == Action.DELETE or instance is None:
+            return {"pk": pk}
+
+        return self.serialize_event(action=action, instance=instance, context=context)
+
+    def emit_refresh(self, subscription: Subscription, room: str):
+        """
+        Tell subscriber events of room are no longer buffered and it must refetch
+        """
+
+        return async_to_sync(self.server.emit)(
+            subscription.namespace,
+            data=dict(
+                method="SUBSCRIPTION",
+                action=subscription.action,
+                type="refresh",
+                status=status.HTTP_200_OK,
+                requestId=subscription.request_id,
+                room=room,
+                seq=self.replay.last_seq(room),
+            ),
+            room=subscription.sid,
+            ignore_queue=self.locality,
+        )
+
+    # dispatch keyword arguments sent along published events
+    event_kwargs = ("created", "changed_fields")
+
+    def encode_values(self, values: Dict[str, Any]) -> list:
+        """
+        Encode field values by attname with django serialization, as an unsaved instance
+        """
+
+        return [sorted(values), self.encode_instances([self.sender(**values)])]
+
+    def decode_values(self, data: list) -> Dict[str, Any]:
+        attnames, encoded = data
+        instance = self.decode_instances(encoded)[0]
+
+        return {attname: getattr(instance, attname) for attname in attnames}
+
+    def encode_instances(self, instances: List[Model]) -> str:
+        """
+        Encode instances with django serialization, concrete fields only
+        """
+
+        fields = {
+            field.name for instance in instances for field in instance._meta.fields
+        }
+
+        return serializers.serialize("json", instances, fields=fields)
+
+    def decode_instances(self, data: str) -> List[Model]:
+        return [
+            item.object
+            for item in serializers.deserialize("json", data, ignorenonexistent=True)
+        ]
+
+    def publish_event(
+        self,
+        action: Action,
+        instances: List[Model],
+        many: bool = False,
+        **kwargs,
+    ):
+        """
+        Publish a model event to every node, each node emits to its own subscribers.
+        With replay the event is numbered here once per room, receiving nodes emit
+        the published sequence numbers.
+        With a sharded manager the event is published once per shard,
+        only to nodes watching its rooms.
+        """
+
+        rooms: Dict[str, List[Model]] = {}
+
+        if self.replay is not None or self.manager.shards > 1:
+            rooms = self.group_by_room(action, instances, **kwargs)
+
+        previous = kwargs.get("previous")
+        seqs = None
+
+        if self.replay is not None:
+            seqs = {
+                room: self.record_event(
+                    room,
+                    action,
+                    (
+                        [instance.pk for instance in room_instances]
+                        if many
+                        else room_instances[0].pk
+                    ),
+                )
+                for room, room_instances in rooms.items()
+            }
+
+        kwargs = {
+            key: sorted(value) if isinstance(value, (set, frozenset)) else value
+            for key, value in kwargs.items()
+            if key in self.event_kwargs
+        }
+
+        event = {
+            "observer": self.name,
+            "action": action.value,
+            "instances": self.encode_instances(instances),
+            "many": many,
+            "kwargs": kwargs,
+        }
+
+        if previous is not None:
+            event["previous"] = self.encode_values(previous)
+
+        if self.manager.shards <= 1:
+            if seqs is not None:
+                event.update(rooms=sorted(rooms), seqs=seqs)
+
+            return self.manager.send_data(event, {"type": "event"})
+
+        shards: Dict[int, List[str]] = {}
+
+        for room in sorted(rooms):
+            shards.setdefault(self.manager.get_shard(room), []).append(room)
+
+        for shard_rooms in shards.values():
+            shard_event = dict(event, rooms=shard_rooms)
+
+            if seqs is not None:
+                shard_event["seqs"] = {room: seqs[room] for room in shard_rooms}
+
+            self.manager.send_data(
+                shard_event,
+                {"type": "event"},
+                room=shard_rooms[0],
+            )
+
+    def receive_event(self, data: dict):
+        """
+        Dispatch a published event to local subscribers, always through a dispatch queue
+        so the manager thread does not serialize or emit
+        """
+
+        action = Action(data["action"])
+        instances = self.decode_instances(data["instances"])
+        kwargs = data.get("kwargs", {})
+
+        if "changed_fields" in kwargs:
+            kwargs["changed_fields"] = set(kwargs["changed_fields"])
+
+        if "previous" in data:
+            kwargs["previous"] = self.decode_values(data["previous"])
+
+        # rooms of the shard the event was published to and their sequence numbers,
+        # resolved by the publisher
+        rooms = data.get("rooms")
+        seqs = data.get("seqs")
+
+        queue = self.dispatch_queue or DispatchQueue.default()
+
+        if data.get("many"):
+            return queue.put(
+                self.perform_bulk_dispatch,
+                action,
+                instances,
+                only_rooms=None if rooms is None else set(rooms),
+                seqs=seqs,
+                key=self.get_dispatch_key(instances),
+                **kwargs,
+            )
+
+        return queue.put(
+            self.perform_dispatch,
+            action,
+            instances[0],
+            rooms=rooms,
+            seqs=seqs,
+            key=self.get_dispatch_key(instances[0]),
+            **kwargs,
+        )
+
+    def dispatch_to_room(
+        self,
+        action: Action,
+        room: str,
+        instance: T | List[T],
+        get_data: Callable[[Subscription | None, Action, T | List[T]], Any],
+        previous: Dict[str, Any] | None = None,
+        **emit_kwargs,
+    ):
+        """
+        Emit event to room subscribers, `get_data(scope, action, instance)` returns
+        the data sent to a subscriber, `action` and `instance` depend on its filter.
+        In `FanOut.ROOM` mode the event is emitted once per socket.io room with
+        `get_data(None, action, instance)`, `participants` and filters are not applied.
+        """
+
+        if self.fan_out == FanOut.ROOM:
+            channels = self.subscribing_scopes.channels(room)
+            data = get_data(None, action, instance) if channels else None
+
+            for namespace, subscription_action in channels:
+                self.room_emitter(
                     action=action,
                     instance=instance,
-                    scope=scope,
-                    data=self.serialize(
-                        action=action,
-                        instance=instance,
-                        context=build_context_from_scope(scope),
-                    ),
+                    room=room,
+                    namespace=namespace,
+                    subscription_action=subscription_action,
+                    data=data,
+                    **emit_kwargs,
                 )
 
-    def emitter(self, action: Action, scope: Scope, data: dict, **kwargs):
+            return
+
+        scopes = self.get_participants(room)
+
+        if hasattr(self, "_participants"):
+            scopes = self._participants(scopes=scopes, instance=instance, action=action)
+
+        for scope, scope_action, scope_instance in self.filter_subscribers(
+            scopes, action, instance, previous
+        ):
+            self.emitter(
+                action=scope_action,
+                instance=scope_instance,
+                scope=scope,
+                data=get_data(scope, scope_action, scope_instance),
+                room=room,
+                **emit_kwargs,
+            )
+
+    def get_predicate(self, query: dict | str) -> QueryPredicate:
+        """
+        Compiled filter of a query or of a `Subscription.query` key
+        """
+
+        key = query if isinstance(query, str) else get_query_key(query)
+
+        return self.predicates.get_or_set(key, lambda: self.compile_predicate(key))
+
+    def compile_predicate(self, key: str) -> QueryPredicate:
+        predicate = QueryPredicate(self.sender, json.loads(key))
+
+        if not predicate.attnames <= self.filter_attnames:
+            self.track_filter_fields(predicate.attnames)
+
+        return predicate
+
+    def track_filter_fields(self, attnames: Set[str]):
+        """
+        Remember fields filtered by subscriptions, their values before an update
+        tell whether the instance enters or leaves a filter
+        """
+
+        with self._filter_lock:
+            self.filter_attnames = self.filter_attnames | attnames
+
+    def filter_subscribers(
+        self,
+        scopes: List[Subscription],
+        action: Action,
+        instance: T | List[T],
+        previous: Dict[str, Any] | None = None,
+    ) -> List[Tuple[Subscription, Action, T | List[T]]]:
+        """
+        Pair subscribers with the action and instances they receive under their `query`,
+        each distinct query is evaluated once
+        """
+
+        matches: Dict[str, Tuple[Action, T | List[T]] | None] = {}
+        filtered = []
+
+        for scope in scopes:
+            key = scope.query
+
+            if not key:
+                filtered.append((scope, action, instance))
+                continue
+
+            if key not in matches:
+                matches[key] = self.match_event(key, action, instance, previous)
+
+            if matches[key] is not None:
+                filtered.append((scope, *matches[key]))
+
+        return filtered
+
+    def match_event(
+        self,
+        key: str,
+        action: Action,
+        instance: T | List[T],
+        previous: Dict[str, Any] | None,
+    ) -> Tuple[Action, T | List[T]] | None:
+        """
+        Action and instances sent to subscribers of a query, `None` when nothing is sent.
+        Bulk events keep the matching instances. Given the values before an update,
+        an update making the instance match is sent as `added`
+        and one making it stop matching as `removed`.
+        """
+
+        try:
+            predicate = self.get_predicate(key)
+        except ValidationError:
+            return None
+
+        if isinstance(instance, list):
+            instances = [item for item in instance if predicate(item)]
+
+            return (action, instances) if instances else None
+
+        matched_before = (
+            predicate.match_values(previous)
+            if action == Action.UPDATE and previous is not None
+            else None
+        )
+
+        if predicate(instance):
+            return (Action.CREATE if matched_before is False else action, instance)
+
+        if matched_before:
+            return (Action.DELETE, instance)
+
+        return None
+
+    def get_data(
+        self,
+        action: Action,
+        instance: T,
+        scope: Subscription,
+        serialized: dict,
+        **kwargs,
+    ):
+        """
+        Serialize instance for subscriber, in `FanOut.GROUP` and `FanOut.ROOM` modes
+        subscribers sharing a context key reuse the same serialized data
+        """
+
+        if self.fan_out == FanOut.SCOPE:
+            return self.serialize_event(
+                action=action,
+                instance=instance,
+                context=scope.get_context(),
+                **kwargs,
+            )
+
+        key = None if scope is None else self.get_context_key(scope)
+
+        if key not in serialized:
+            serialized[key] = self.serialize_event(
+                action=action,
+                instance=instance,
+                context={} if key is None else scope.get_context(),
+                **kwargs,
+            )
+
+        return serialized[key]
+
+    def serialize_event(self, action: Action, instance: T, context: dict, **kwargs):
+        """
+        Serialize instance for an event, `kwargs` are the dispatch keyword arguments
+        """
+
+        return self.serialize(action=action, instance=instance, context=context)
+
+    def get_payload(
+        self,
+        action: Action,
+        subscription_action: str,
+        request_id: str | None,
+        data: Any,
+        many: bool = False,
+        seq: int | None = None,
+        room: str | None = None,
+        **kwargs,
+    ):
+        payload = dict(
+            method="SUBSCRIPTION",
+            action=subscription_action,
+            type=action.value,
+            status=status.HTTP_200_OK,
+            requestId=request_id,
+            data=data,
+        )
+
+        if many:
+            payload["many"] = True
+
+        if seq is not None:
+            payload["seq"] = seq
+            payload["room"] = room
+
+        return payload
+
+    def emitter(self, action: Action, scope: Subscription, data: dict, **kwargs):
         """
         Send message to clients
         """
 
         return async_to_sync(self.server.emit)(
             scope.namespace,
+            data=self.get_payload(
+                action, scope.action, scope.request_id, data, **kwargs
+            ),
+            room=scope.sid,
+            ignore_queue=self.locality,
+        )
+
+    def room_emitter(
+        self,
+        action: Action,
+        room: str,
+        namespace: str,
+        subscription_action: str,
+        data: dict,
+        **kwargs,
+    ):
+        """
+        Send message to all clients in a socket.io room,
+        `requestId` is not known here so `room` is sent instead
+        """
+
+        return async_to_sync(self.server.emit)(
+            namespace,
             data=dict(
-                method="SUBSCRIPTION",
-                action=scope.action,
-                type=action.value,
-                status=status.HTTP_200_OK,
-                requestId=scope.request_id,
-                data=data,
+                self.get_payload(
+                    action, subscription_action, None, data, room=room, **kwargs
+                ),
+                room=room,
             ),
+            room=self.get_room_key(room, namespace, subscription_action),
+            ignore_queue=self.locality,
         )
 
     @property
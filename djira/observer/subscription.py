@@ -0,0 +1,122 @@
+import json
+import sys
+
+from typing import Tuple
+
+from djira.cache import user_cache
+from djira.scope import Scope
+from djira._utils import build_context_from_scope
+
+from .filters import get_query_key
+
+
+class Subscription:
+    """
+    Compact subscription record kept for every subscriber of a room.
+
+    Only what fan-out needs is stored, the serializer context is rebuilt
+    from it on demand with `get_context`.
+    `origin` is the context handle, the interned `scheme://host` the client
+    connected with, used by `build_absolute_uri`.
+    `query` is the subscription filter as interned canonical json,
+    `None` when every event is wanted.
+    """
+
+    __slots__ = (
+        "sid",
+        "namespace",
+        "action",
+        "request_id",
+        "user_pk",
+        "origin",
+        "query",
+    )
+
+    def __init__(
+        self,
+        sid: str,
+        namespace: str,
+        action: str | None,
+        request_id: str,
+        user_pk=None,
+        origin: str | None = None,
+        query: dict | None = None,
+    ):
+        self.sid = sid
+        self.namespace = namespace
+        self.action = action
+        self.request_id = request_id
+        self.user_pk = user_pk
+        self.origin = sys.intern(origin) if origin else None
+        self.query = sys.intern(get_query_key(query)) if query else None
+
+    @property
+    def key(self) -> Tuple[str, str, str]:
+        return (self.sid, self.namespace, self.request_id)
+
+    @property
+    def user(self):
+        """
+        Load subscriber user through the user cache
+        """
+        return user_cache.get_user(self.user_pk)
+
+    @classmethod
+    def from_scope(cls, scope: Scope):
+        return cls(
+            sid=scope.sid,
+            namespace=scope.namespace,
+            action=scope.action,
+            request_id=scope.request_id,
+            user_pk=scope.user_pk,
+            origin=scope.origin,
+            query=scope.query.dict(),
+        )
+
+    @classmethod
+    def from_json(cls, json: dict):
+        """
+        Build subscription from `Scope.to_json`
+        """
+        fields = Scope.decode_json(json)
+
+        return cls(
+            sid=fields["sid"],
+            namespace=fields["namespace"],
+            action=fields["action"],
+            request_id=fields["request_id"],
+            user_pk=fields["user_pk"],
+            origin=fields["origin"],
+            query=fields["query"],
+        )
+
+    def to_scope(self) -> Scope:
+        """
+        Rebuild scope, user is loaded on first access
+        """
+        return Scope.from_decoded_json(
+            dict(
+                sid=self.sid,
+                namespace=self.namespace,
+                action=self.action,
+                request_id=self.request_id,
+                user_pk=self.user_pk,
+                origin=self.origin,
+                query=json.loads(self.query) if self.query else None,
+            )
+        )
+
+    def get_context(self):
+        """
+        Rebuild serializer context for subscriber
+        """
+        return build_context_from_scope(self.to_scope())
+
+    def __eq__(self, other):
+        return isinstance(other, Subscription) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return "<Subscription sid=%s namespace=%s requestId=%s>" % self.key
@@ -0,0 +1,95 @@
+from copy import copy
+from typing import Dict, Hashable, Tuple
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .base_observer import Action
+
+
+def coalesce(previous: Action | None, action: Action) -> Action | None:
+    """
+    Net action of `previous` followed by `action` on the same row,
+    `None` when the row was created and deleted in the same transaction
+    """
+    if previous is None:
+        return action
+
+    if previous == Action.CREATE:
+        return None if action == Action.DELETE else Action.CREATE
+
+    if previous == Action.DELETE and action == Action.CREATE:
+        return Action.UPDATE
+
+    return action
+
+
+class TransactionBatch:
+    """
+    Model events buffered until the current transaction commits,
+    repeated events on the same `(observer, model, pk)` are coalesced into one.
+    Events of a rolled back transaction are discarded with it.
+    """
+
+    def __init__(self, using: str):
+        self.using = using
+        # insertion ordered, events are flushed in the order rows were first touched
+        self.events: Dict[Hashable, Tuple[object, Action | None, object, dict]] = {}
+
+    @classmethod
+    def dispatch(cls, observer, action: Action, instance, **kwargs):
+        """
+        Buffer event until commit, dispatch right away outside of a transaction
+        """
+        using = kwargs.get("using") or DEFAULT_DB_ALIAS
+        connection = connections[using]
+
+        if not connection.in_atomic_block:
+            return observer.dispatch(action=action, instance=instance, **kwargs)
+
+        batch: TransactionBatch | None = getattr(connection, "djira_batch", None)
+
+        # rollback drops pending `on_commit` callbacks along with our flush
+        if batch is None or not batch.is_pending(connection):
+            batch = cls(using)
+            connection.djira_batch = batch
+            transaction.on_commit(batch.flush, using=using)
+
+        batch.add(observer, action, instance, **kwargs)
+
+    def is_pending(self, connection) -> bool:
+        return any(callback[1] == self.flush for callback in connection.run_on_commit)
+
+    def add(self, observer, action: Action, instance, **kwargs):
+        key = (id(observer), instance._meta.label, instance.pk)
+        previous = self.events.get(key)
+
+        # delta updates send the union of fields changed in the transaction
+        if previous and "changed_fields" in kwargs:
+            kwargs["changed_fields"] = kwargs["changed_fields"] | previous[3].get(
+                "changed_fields", set()
+            )
+
+        # filters compare against the state before the first change
+        if previous:
+            kwargs.pop("previous", None)
+
+            if "previous" in previous[3]:
+                kwargs["previous"] = previous[3]["previous"]
+
+        # copy, delete resets pk before the transaction commits
+        self.events[key] = (
+            observer,
+            coalesce(previous[1] if previous else None, action),
+            copy(instance),
+            kwargs,
+        )
+
+    def flush(self):
+        connection = connections[self.using]
+
+        if getattr(connection, "djira_batch", None) is self:
+            connection.djira_batch = None
+
+        for observer, action, instance, kwargs in self.events.values():
+            if action is not None:
+                observer.dispatch(action=action, instance=instance, **kwargs)
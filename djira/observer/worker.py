@@ -0,0 +1,91 @@
+import asyncio
+import logging
+
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+from typing import Any, Callable, List
+
+logger = logging.getLogger(__name__)
+
+
+class MessageWorker:
+    """
+    Single long-lived thread handling messages in the order they are put.
+
+    Messages are drained in batches of up to `batch_size` and passed to `handler`.
+    When `maxsize` messages are waiting `put` blocks, except on a thread running
+    an event loop which must not be frozen, there the message is dropped and counted.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[Any]], None],
+        maxsize: int = 10000,
+        batch_size: int = 100,
+    ):
+        self.handler = handler
+        self.batch_size = batch_size
+
+        self.dropped = 0
+
+        self._queue: Queue = Queue(maxsize)
+        self._thread: Thread | None = None
+        self._lock = Lock()
+
+    def put(self, message: Any) -> bool:
+        """
+        Queue message, return `False` if it was dropped
+        """
+        self.start()
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._queue.put(message)
+            return True
+
+        try:
+            self._queue.put_nowait(message)
+        except Full:
+            self.dropped += 1
+            logger.warning("message worker is full, dropping message")
+            return False
+
+        return True
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except Empty:
+                pass
+
+            try:
+                self.handler(batch)
+            except Exception:
+                logger.exception("message worker handler failed")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def join(self):
+        """
+        Block until all messages put so far are handled
+        """
+        self._queue.join()
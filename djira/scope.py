@@ -1,23 +1,21 @@
 from typing import Any, Dict
 
-import asyncio
-
 from datetime import time
 
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlsplit
 
 from django.http import QueryDict
 from django.contrib.auth.models import User
 
-from rest_framework.exceptions import NotFound
-
 from socketio import Server
 
-from djira.db import database_sync_to_async
-
+from .cache import user_cache
 from .typing import Method
 from .settings import jira_settings
 
+# version of the `Scope.to_json` encoding
+SCOPE_JSON_VERSION = 2
+
 
 class Scope:
     socket: Server = jira_settings.SOCKET_INSTANCE
@@ -29,10 +27,12 @@ class Scope:
         raw_data: dict,
         user: User = None,
         session=None,
+        user_pk=None,
     ):
         self._sid = sid
         self._namespace = namespace
         self._user = user
+        self._user_pk = user_pk
         self._raw_data = raw_data
         self._session = session
 
@@ -48,6 +48,24 @@ class Scope:
     def environ(self):
         return self._session["environ"]
 
+    @property
+    def origin(self) -> str | None:
+        """
+        `scheme://host` the client connected with
+        """
+        if not self._session:
+            return None
+
+        environ = self._session.get("environ", {})
+
+        if "HTTP_HOST" not in environ:
+            return None
+
+        return "%s://%s" % (
+            environ.get("wsgi.url_scheme", "http"),
+            environ["HTTP_HOST"],
+        )
+
     @property
     def request_id(self):
         return self._raw_data.get("requestId", time().isoformat())
@@ -66,8 +84,18 @@ class Scope:
 
     @property
     def user(self):
+        """
+        When scope is decoded from json, user is loaded from the user cache on first access
+        """
+        if self._user is None and self._user_pk is not None:
+            self._user = user_cache.get_user(self._user_pk)
+
         return self._user
 
+    @property
+    def user_pk(self):
+        return self._user.pk if self._user is not None else self._user_pk
+
     @property
     def action(self) -> str:
         return self._raw_data.get("action")
@@ -95,30 +123,90 @@ class Scope:
         )
 
     def to_json(self):
-        return {
+        """
+        Compact encoding with what subscription fan-out needs,
+        the raw request payload and session are not sent
+        """
+        query = self._raw_data.get("query")
+
+        json = {
+            "v": SCOPE_JSON_VERSION,
             "sid": self._sid,
-            "user_id": self._user.pk,
-            "raw_data": self._raw_data,
-            "namespace": self._namespace,
+            "ns": self._namespace,
+            "action": self.action,
+            "rid": self.request_id,
+            "uid": self.user_pk,
+            "origin": self.origin,
         }
 
+        if query:
+            json["query"] = query
+
+        return json
+
+    @staticmethod
+    def decode_json(json: dict) -> Dict[str, Any]:
+        """
+        Decode `to_json` output, scopes encoded by previous versions are supported
+        """
+        if "v" not in json:
+            raw_data = json["raw_data"]
+            scope = Scope(json["sid"], json["namespace"], raw_data)
+
+            return dict(
+                sid=scope.sid,
+                namespace=scope.namespace,
+                action=scope.action,
+                request_id=scope.request_id,
+                user_pk=json.get("user_id"),
+                origin=json.get("origin"),
+                query=raw_data.get("query") or None,
+            )
+
+        if json["v"] == 1:
+            user = json["user"]
+            user_pk = user["pk"] if user else None
+        else:
+            user_pk = json["uid"]
+
+        return dict(
+            sid=json["sid"],
+            namespace=json["ns"],
+            action=json["action"],
+            request_id=json["rid"],
+            user_pk=user_pk,
+            origin=json["origin"],
+            query=json.get("query"),
+        )
+
+    @classmethod
+    def from_decoded_json(cls, fields: Dict[str, Any]):
+        """
+        Build a scope from `decode_json` output, user is loaded lazily
+        """
+        environ = {}
+
+        if fields["origin"]:
+            url = urlsplit(fields["origin"])
+            environ = {"wsgi.url_scheme": url.scheme, "HTTP_HOST": url.netloc}
+
+        return cls(
+            fields["sid"],
+            fields["namespace"],
+            {
+                "method": "SUBSCRIPTION",
+                "action": fields["action"],
+                "requestId": fields["request_id"],
+                "query": fields.get("query") or {},
+            },
+            session={"environ": environ},
+            user_pk=fields["user_pk"],
+        )
+
     @classmethod
     async def from_json(cls, json: dict):
-        sid = json["sid"]
-        session = await cls.socket.get_session(sid)
-
-        try:
-            return cls(
-                sid=sid,
-                session=session,
-                raw_data=json["raw_data"],
-                namespace=json["namespace"],
-                user=database_sync_to_async(User.objects.get)(pk=json["user_id"]),
-            )
-        except User.DoesNotExist as error:
-            raise NotFound(
-                {
-                    "status": "failed",
-                    "message": "can't decode scope, user does not exist",
-                }
-            ) from error
+        scope = cls.from_decoded_json(cls.decode_json(json))
+
+        scope._user = await user_cache.aget_user(scope._user_pk)
+
+        return scope
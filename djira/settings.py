@@ -15,6 +15,28 @@ DEFAULT_JIRA_SETTINGS = {
     "PERMISSION_CLASSES": ["djira.permissions.AllowAny"],
     "DEFAULT_PAGINATION_CLASS": "djira.pagination.PagePagination",
     "PAGE_SIZE": 16,
+    "OBSERVER_FAN_OUT": "scope",
+    "OBSERVER_ON_COMMIT": False,
+    "DISPATCH_QUEUE": False,
+    "DISPATCH_QUEUE_SIZE": 10000,
+    "DISPATCH_QUEUE_CONCURRENCY": 4,
+    "DISPATCH_QUEUE_POLICY": "drop",
+    "USER_CACHE_SIZE": 4096,
+    "USER_CACHE_TTL": 60,
+    "SUBSCRIPTION_LOCALITY": False,
+    "REPLAY_BUFFER_SIZE": 0,
+    "REPLAY_BUFFER_ROOMS": 10000,
+    "REPLAY_BUFFER_TTL": 86400,
+    "MANAGER_BATCH_INTERVAL": 0,
+    "MANAGER_BATCH_SIZE": 100,
+    "MANAGER_CODEC": "djira.observer.manager.codec.MsgpackCodec",
+    "MANAGER_MAX_CONNECTIONS": 10,
+    "MANAGER_HEALTH_CHECK_INTERVAL": 30,
+    "MANAGER_POOL_TIMEOUT": 5,
+    "MANAGER_SHARDS": 1,
+    "MANAGER_OUTBOX_SIZE": 10000,
+    "MANAGER_OUTBOX_OVERFLOW": "drop_oldest",
+    "MANAGER_OUTBOX_PATH": None,
 }
 
 IMPORT_STRINGS = [
@@ -24,6 +46,7 @@ IMPORT_STRINGS = [
     "DEFAULT_MANAGER",
     "AUTHENTICATION_CLASSES",
     "DEFAULT_PAGINATION_CLASS",
+    "MANAGER_CODEC",
 ]
 
 
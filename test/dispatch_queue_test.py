@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+import django
+
+from django.conf import settings
+
+settings.configure(
+    INSTALLED_APPS=["django.contrib.contenttypes", "django.contrib.auth"]
+)
+django.setup()
+
+from djira.observer.queue import DispatchQueue
+
+received = []
+
+
+def job(key, value):
+    # slower for early values, so jobs of a key would overtake each other in parallel
+    time.sleep(0.001 * (20 - value))
+    received.append((key, value))
+
+
+async def main():
+    queue = DispatchQueue(maxsize=1000, concurrency=4)
+    DispatchQueue.attach(asyncio.get_running_loop())
+
+    for value in range(20):
+        for key in ("a", "b", "c"):
+            queue.put(job, key, value, key=key)
+
+    await queue.join()
+
+    # jobs of a key run in the order they are put
+    for key in ("a", "b", "c"):
+        assert [value for k, value in received if k == key] == list(range(20))
+
+    print(queue.stats)
+
+
+asyncio.run(main())
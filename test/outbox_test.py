@@ -0,0 +1,78 @@
+import django
+
+from django.conf import settings
+
+settings.configure(
+    INSTALLED_APPS=["django.contrib.contenttypes", "django.contrib.auth"]
+)
+django.setup()
+
+import gc
+import os
+import tempfile
+
+from djira.observer.manager.outbox import Outbox, OutboxFull
+
+
+def drain(outbox: Outbox):
+    messages = []
+
+    while (entry := outbox.peek()) is not None:
+        messages.append(entry[2])
+        outbox.pop()
+
+    return messages
+
+
+# on overflow the oldest or the newest message is dropped, or the put fails
+outbox = Outbox(2, Outbox.DROP_OLDEST)
+
+for data in (b"1", b"2", b"3"):
+    outbox.put("channel", data)
+
+assert drain(outbox) == [b"2", b"3"] and outbox.dropped == 1
+
+outbox = Outbox(2, Outbox.DROP_NEWEST)
+
+for data in (b"1", b"2", b"3"):
+    outbox.put("channel", data)
+
+assert drain(outbox) == [b"1", b"2"] and outbox.dropped == 1
+
+outbox = Outbox(1, Outbox.RAISE)
+outbox.put("channel", b"1")
+
+try:
+    outbox.put("channel", b"2")
+    assert False
+except OutboxFull:
+    pass
+
+# messages beyond `maxsize` are spilled and loaded back in order
+prefix = os.path.join(tempfile.mkdtemp(), "outbox")
+outbox = Outbox(2, path=prefix)
+other = Outbox(2, path=prefix)
+
+assert outbox.path != other.path and os.path.exists(outbox.path)
+
+for index in range(7):
+    outbox.put("channel-%d" % index, b"%d" % index)
+
+assert len(outbox) == 7 and outbox.stats["spilled"] == 5
+assert outbox.peek()[1:] == ("channel-0", b"0")
+
+outbox.pop()
+outbox.put("channel-7", b"7")  # queued behind the spilled messages
+
+assert drain(outbox) == [b"%d" % index for index in range(1, 8)]
+assert outbox.dropped == 0 and outbox.drained == 8
+assert os.path.getsize(outbox.path) == 0
+
+# the spill file is removed with its outbox
+path = outbox.path
+del outbox
+gc.collect()
+
+assert not os.path.exists(path) and os.path.exists(other.path)
+
+print("ok")
@@ -0,0 +1,68 @@
+import django
+
+from django.conf import settings
+
+settings.configure(
+    INSTALLED_APPS=["django.contrib.contenttypes", "django.contrib.auth"]
+)
+django.setup()
+
+from datetime import datetime, timezone
+
+from django.contrib.auth.models import User
+from rest_framework.exceptions import ValidationError
+
+from djira.observer.filters import QueryPredicate, get_query_key
+
+alice = User(pk=1, username="Alice", is_staff=True, email="alice@example.com")
+bob = User(pk=2, username="bob", is_staff=False, email="bob@example.org")
+bob.last_login = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+def matches(query: dict):
+    predicate = QueryPredicate(User, query)
+    return [predicate(alice), predicate(bob)]
+
+
+# lookups, values are parsed with the field
+assert matches({"is_staff": "true"}) == [True, False]
+assert matches({"username": "alice"}) == [False, False]
+assert matches({"username__iexact": "alice"}) == [True, False]
+assert matches({"id__in": "2,3"}) == [False, True]
+assert matches({"username__icontains": "LI"}) == [True, False]
+assert matches({"email__endswith": ".org"}) == [False, True]
+assert matches({"username__istartswith": "B"}) == [False, True]
+assert matches({"id__gt": "1"}) == [False, True]
+assert matches({"id__lte": 1}) == [True, False]
+assert matches({"id__range": "1,1"}) == [True, False]
+assert matches({"last_login__isnull": "true"}) == [True, False]
+assert matches({"last_login__gte": "2019-12-31T00:00:00Z"}) == [False, True]
+
+# every condition must match, a key ending with `!` is negated
+assert matches({"is_staff": "true", "id": 2}) == [False, False]
+assert matches({"username!": "bob"}) == [True, False]
+assert matches({"id__in!": "1,2"}) == [False, False]
+
+# keys that can't be evaluated in memory are ignored
+assert matches({"page": 2, "ordering": "-id", "groups__name": "a"}) == [True, True]
+assert not QueryPredicate(User, {"page": 2}).conditions
+
+# invalid values are rejected
+try:
+    QueryPredicate(User, {"id__gt": "x"})
+    assert False
+except ValidationError:
+    pass
+
+# field values before an update, `None` when a filtered field is missing
+predicate = QueryPredicate(User, {"is_staff": "true", "username!": "bob"})
+
+assert predicate.attnames == {"is_staff", "username"}
+assert predicate.match_values({"is_staff": True, "username": "a"}) is True
+assert predicate.match_values({"is_staff": True, "username": "bob"}) is False
+assert predicate.match_values({"is_staff": True}) is None
+
+# identical queries share a key
+assert get_query_key({"b": 1, "a": 2}) == get_query_key({"a": 2, "b": 1})
+
+print("ok")
@@ -0,0 +1,22 @@
+from djira.observer.manager.redis_manager import RedisManager
+
+manager = RedisManager.connect_from_url("redis://127.0.0.1:6379", batch_interval=0.01)
+manager.subscribe(print)
+
+# an envelope is decoded once, each message reaches the listener
+manager._on_message(
+    {
+        "data": manager.codec.encode(
+            {
+                "batch": [
+                    {"data": {"message": 1}, "filter": None},
+                    {"data": {"message": 2}, "filter": None},
+                ]
+            }
+        )
+    }
+)
+
+# messages sent within the interval are published as one envelope
+manager.send_data({"message": 3}, None)
+manager.send_data({"message": 4}, None)
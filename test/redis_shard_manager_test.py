@@ -0,0 +1,14 @@
+from time import sleep
+
+from djira.observer.manager.redis_manager import RedisManager
+
+publisher = RedisManager.connect_from_url("redis://127.0.0.1:6379", shards=4)
+manager = RedisManager.connect_from_url("redis://127.0.0.1:6379", shards=4)
+manager.subscribe(print)
+
+# only messages of watched rooms and messages without a room are printed
+manager.watch("orders")
+sleep(0.5)  # shard subscriptions are applied by the listening thread
+publisher.send_data({"room": "orders"}, {"type": "event"}, room="orders")
+publisher.send_data({"room": "invoices"}, {"type": "event"}, room="invoices")
+publisher.send_data({"room": None}, {"type": "subscribe"})
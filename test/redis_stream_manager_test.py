@@ -0,0 +1,8 @@
+from djira.observer.manager.redis_stream_manager import RedisStreamManager
+
+manager = RedisStreamManager.connect_from_url("redis://127.0.0.1:6379", group="test")
+manager.subscribe(print)
+
+# entries delivered but not acknowledged before a restart are printed first
+manager.pull()
+manager.send_data({"scope": "stream"}, {})
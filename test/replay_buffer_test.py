@@ -0,0 +1,46 @@
+import django
+
+from django.conf import settings
+
+settings.configure(
+    INSTALLED_APPS=["django.contrib.contenttypes", "django.contrib.auth"]
+)
+django.setup()
+
+from djira.observer.replay import ReplayBuffer, resume
+
+# events after `seq`, `None` when the client must refresh
+events = [(3, "added", 1), (4, "modified", 1), (5, "removed", 2)]
+
+assert resume(events, 4, 5) == [(5, "removed", 2)]
+assert resume(events, 2, 5) == events
+assert resume(events, 5, 5) == []
+assert resume(events, 1, 5) is None  # rolled over, event 2 is gone
+assert resume(events, 6, 5) is None  # ahead of the room, sequence was reset
+assert resume([], 0, 0) == []
+
+# each room is numbered on its own, only the last `size` events are kept
+buffer = ReplayBuffer(2, max_rooms=2)
+
+assert [buffer.append("a", "added", pk) for pk in (1, 2, 3)] == [1, 2, 3]
+assert buffer.append("b", "added", 1) == 1
+assert buffer.since("a", 1) == [(2, "added", 2), (3, "added", 3)]
+assert buffer.since("a", 2) == [(3, "added", 3)]
+assert buffer.since("a", 0) is None
+assert buffer.since("b", 0) == [(1, "added", 1)]
+
+# the room written least recently is evicted, its clients are told to refresh
+assert buffer.append("a", "modified", 1) == 4
+assert buffer.append("c", "added", 1) == 1
+
+assert buffer.last_seq("b") == 0
+assert buffer.since("b", 1) is None
+
+# rooms created afterwards start above every evicted sequence
+assert buffer.append("b", "added", 2) == 2
+assert buffer.since("a", 3) is None
+assert buffer.append("a", "added", 1) == 5
+assert buffer.since("a", 4) == [(5, "added", 1)]
+assert buffer.since("a", 3) is None
+
+print("ok")
@@ -0,0 +1,87 @@
+import django
+
+from django.conf import settings
+
+settings.configure(
+    INSTALLED_APPS=["django.contrib.contenttypes", "django.contrib.auth"],
+    DATABASES={"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}},
+)
+django.setup()
+
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.db import transaction
+
+from djira.observer.base_observer import Action
+from djira.observer.transaction import TransactionBatch, coalesce
+
+call_command("migrate", verbosity=0, run_syncdb=True)
+
+# net action of two events on the same row
+assert coalesce(None, Action.UPDATE) == Action.UPDATE
+assert coalesce(Action.CREATE, Action.UPDATE) == Action.CREATE
+assert coalesce(Action.CREATE, Action.DELETE) is None
+assert coalesce(Action.UPDATE, Action.DELETE) == Action.DELETE
+assert coalesce(Action.DELETE, Action.CREATE) == Action.UPDATE
+assert coalesce(Action.UPDATE, Action.UPDATE) == Action.UPDATE
+
+
+class Observer:
+    def __init__(self):
+        self.events = []
+
+    def dispatch(self, action, instance, **kwargs):
+        self.events.append((action, instance.pk, kwargs.get("changed_fields")))
+
+
+observer = Observer()
+
+# outside a transaction events are dispatched right away
+group = Group.objects.create(name="a")
+TransactionBatch.dispatch(observer, Action.CREATE, group)
+assert observer.events == [(Action.CREATE, group.pk, None)]
+
+# events are sent on commit, coalesced per row in the order rows were first touched
+observer.events = []
+
+with transaction.atomic():
+    first = Group.objects.create(name="b")
+    TransactionBatch.dispatch(observer, Action.CREATE, first)
+    TransactionBatch.dispatch(observer, Action.UPDATE, group, changed_fields={"name"})
+    TransactionBatch.dispatch(observer, Action.UPDATE, first)
+    TransactionBatch.dispatch(observer, Action.UPDATE, group, changed_fields={"id"})
+
+    temporary = Group.objects.create(name="c")
+    TransactionBatch.dispatch(observer, Action.CREATE, temporary)
+    # `post_delete` is sent before the pk is reset
+    TransactionBatch.dispatch(observer, Action.DELETE, temporary)
+    temporary.delete()
+
+    assert observer.events == []
+
+assert observer.events == [
+    (Action.CREATE, first.pk, None),
+    (Action.UPDATE, group.pk, {"name", "id"}),
+], observer.events
+
+# a rolled back transaction sends nothing
+observer.events = []
+
+try:
+    with transaction.atomic():
+        TransactionBatch.dispatch(observer, Action.UPDATE, group)
+        raise RuntimeError()
+except RuntimeError:
+    pass
+
+assert observer.events == []
+
+# a deleted row keeps its pk in the event
+with transaction.atomic():
+    pk = first.pk
+    TransactionBatch.dispatch(observer, Action.DELETE, first)
+    first.delete()
+
+assert observer.events == [(Action.DELETE, pk, None)], observer.events
+
+print("ok")
@@ -0,0 +1,138 @@
+"""
+Compare manager codecs on realistic payloads, encode/decode time and message size.
+
+    python tools/bench_codec.py [iterations]
+"""
+
+import sys
+import timeit
+
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(BASE_DIR))
+
+import django
+
+from django.conf import settings
+
+settings.configure(
+    INSTALLED_APPS=["django.contrib.contenttypes", "django.contrib.auth"],
+)
+django.setup()
+
+from djira.observer.manager.codec import BinaryCodec, JSONCodec, MsgpackCodec
+
+
+def subscribe_message(index: int):
+    """
+    Subscribe message as sent by `BaseObserver._send_data`
+    """
+    return {
+        "data": {
+            "scope": {
+                "v": 1,
+                "sid": "Gx8Yb2kz3Vq9mJ1eAAA%d" % index,
+                "ns": "orders",
+                "action": "subscribe",
+                "rid": "4f1c2e9a-7b3d-4c8e-9f0a-%012d" % index,
+                "user": {"pk": index, "username": "user%d" % index},
+                "origin": "https://api.example.com",
+                "query": {"status": "open", "region__in": "eu,us"},
+            },
+            "room_name": "orders__region__eu",
+        },
+        "filter": {"type": "subscribe"},
+    }
+
+
+def legacy_subscribe_message(index: int):
+    """
+    Subscribe message before scopes were compactly encoded, with the raw request
+    """
+    return {
+        "data": {
+            "scope": {
+                "sid": "Gx8Yb2kz3Vq9mJ1eAAA%d" % index,
+                "namespace": "orders",
+                "user_id": index,
+                "raw_data": {
+                    "method": "SUBSCRIPTION",
+                    "action": "subscribe",
+                    "requestId": "4f1c2e9a-7b3d-4c8e-9f0a-%012d" % index,
+                    "headers": {
+                        "authorization": "Token %040d" % index,
+                        "accept-language": "en-US,en;q=0.9",
+                    },
+                    "query": {"status": "open", "region__in": "eu,us"},
+                    "data": {"since": 1024},
+                },
+            },
+            "room_name": "orders__region__eu",
+        },
+        "filter": {"type": "subscribe"},
+    }
+
+
+def event_message(index: int):
+    """
+    Model event published in locality mode
+    """
+    return {
+        "data": {
+            "observer": "shop.order:0",
+            "action": "modified",
+            "instances": '[{"model": "shop.order", "pk": %d, "fields": '
+            '{"status": "open", "region": "eu", "total": "129.90", '
+            '"created_at": "2024-01-01T10:00:00Z"}}]' % index,
+            "many": False,
+            "kwargs": {"created": False, "changed_fields": ["status"]},
+        },
+        "filter": {"type": "event"},
+    }
+
+
+PAYLOADS = {
+    "subscribe": subscribe_message(1),
+    "legacy subscribe": legacy_subscribe_message(1),
+    "event": event_message(1),
+    "batch of 100": {"batch": [subscribe_message(index) for index in range(100)]},
+}
+
+CODECS = {
+    "json": JSONCodec(),
+    "binary json": BinaryCodec(),
+    "binary msgpack": MsgpackCodec(),
+}
+
+
+def bench(iterations: int):
+    print(
+        "%-18s %-16s %10s %12s %12s"
+        % ("payload", "codec", "bytes", "encode us", "decode us")
+    )
+
+    for name, payload in PAYLOADS.items():
+        for codec_name, codec in CODECS.items():
+            data = codec.encode(payload)
+
+            assert codec.decode(data) == payload
+
+            encode = timeit.timeit(lambda: codec.encode(payload), number=iterations)
+            decode = timeit.timeit(lambda: codec.decode(data), number=iterations)
+
+            print(
+                "%-18s %-16s %10d %12.2f %12.2f"
+                % (
+                    name,
+                    codec_name,
+                    len(data),
+                    encode / iterations * 1e6,
+                    decode / iterations * 1e6,
+                )
+            )
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)